@@ -0,0 +1,188 @@
+import os
+import hashlib
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy import sparse
+
+from src.util import (
+    read_layer,
+    read_stats,
+    source_hash,
+    replace_atomically,
+    LAYER_CACHE_DIR,
+    EQUAL_AREA_CRS,
+)
+
+OVERLAP_CACHE_SIZE = 16
+
+Overlap = namedtuple('Overlap', 'areas source_ids target_ids source_area target_area')
+Overlap.__doc__ = """
+Overlap areas between two boundary layers in square meters. areas is a sparse
+(target features x source features) matrix; ids are the join values of the features.
+"""
+
+
+def _layer_geometries(fp: str, on: str) -> tuple:
+    """
+    :return: (ids, equal-area geometries), features sharing an id unioned
+    """
+    frame = read_layer(fp, columns=[on]).to_crs(EQUAL_AREA_CRS)
+    frame = frame.dissolve(by=on)
+    return np.asarray(frame.index.astype(str), dtype=str), np.asarray(frame.geometry)
+
+
+def compute_overlap(source_fp: str, target_fp: str, source_on: str='NAME', target_on: str='NAME') -> Overlap:
+    """
+    Intersects every source feature with the target features its bounding box meets.
+    """
+    source_ids, source_geoms = _layer_geometries(source_fp, source_on)
+    target_ids, target_geoms = _layer_geometries(target_fp, target_on)
+
+    tree = shapely.STRtree(source_geoms)
+    target_idx, source_idx = tree.query(target_geoms, predicate='intersects')
+    areas = shapely.area(shapely.intersection(target_geoms[target_idx], source_geoms[source_idx]))
+    matrix = sparse.csr_matrix(
+        (areas, (target_idx, source_idx)),
+        shape=(len(target_ids), len(source_ids)),
+    )
+    matrix.eliminate_zeros()
+    return Overlap(matrix, source_ids, target_ids, shapely.area(source_geoms), shapely.area(target_geoms))
+
+
+def _overlap_cache_fp(cache_dir: str, key: str, source_fp: str, target_fp: str) -> str:
+    source_stem = os.path.splitext(os.path.basename(source_fp))[0]
+    target_stem = os.path.splitext(os.path.basename(target_fp))[0]
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f'overlap-{source_stem}-{target_stem}-{digest}.npz')
+
+
+def overlap_matrix(
+        source_fp: str,
+        target_fp: str,
+        source_on: str='NAME',
+        target_on: str='NAME',
+        cache_dir: str=LAYER_CACHE_DIR,
+) -> Overlap:
+    """
+    Overlap areas between two boundary layers, computed in an equal-area CRS. The result is kept
+    in memory and stored in cache_dir, both keyed by the content of the two shapefiles.
+    :param source_fp: Filepath to the boundaries the data is tied to (shapefile)
+    :param target_fp: Filepath to the boundaries the data is interpolated to (shapefile)
+    :param source_on: Column identifying source features
+    :param target_on: Column identifying target features
+    :param cache_dir: Directory for stored overlap matrices
+    :return: Overlap
+    """
+    key = ':'.join([source_hash(source_fp), source_on, source_hash(target_fp), target_on])
+    cache_fp = _overlap_cache_fp(cache_dir, key, source_fp, target_fp)
+    return _overlap_matrix(os.path.abspath(source_fp), os.path.abspath(target_fp), source_on, target_on, cache_fp)
+
+
+@lru_cache(maxsize=OVERLAP_CACHE_SIZE)
+def _overlap_matrix(source_fp: str, target_fp: str, source_on: str, target_on: str, cache_fp: str) -> Overlap:
+    try:
+        with np.load(cache_fp) as stored:
+            matrix = sparse.csr_matrix(
+                (stored['data'], stored['indices'], stored['indptr']),
+                shape=tuple(stored['shape']),
+            )
+            return Overlap(
+                matrix,
+                stored['source_ids'],
+                stored['target_ids'],
+                stored['source_area'],
+                stored['target_area'],
+            )
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # pickled ids of older caches, truncated files and the like are recomputed
+        logging.warning(f"overlap_matrix: Cached {cache_fp} is unreadable ({type(e).__name__}).")
+
+    overlap = compute_overlap(source_fp, target_fp, source_on, target_on)
+    os.makedirs(os.path.dirname(cache_fp) or '.', exist_ok=True)
+    replace_atomically(cache_fp, lambda tmp_fp: np.savez(
+        tmp_fp,
+        data=overlap.areas.data,
+        indices=overlap.areas.indices,
+        indptr=overlap.areas.indptr,
+        shape=np.asarray(overlap.areas.shape),
+        source_ids=np.asarray(overlap.source_ids, dtype=str),
+        target_ids=np.asarray(overlap.target_ids, dtype=str),
+        source_area=overlap.source_area,
+        target_area=overlap.target_area,
+    ))
+    logging.info(f"overlap_matrix: {overlap.areas.nnz} overlaps written to {cache_fp}.")
+    return overlap
+
+
+def weights(overlap: Overlap, extensive: bool=True) -> sparse.csr_matrix:
+    """
+    :param overlap: Overlap
+    :param extensive: Weights for counts, which are split by the share of each source feature's
+        area; otherwise for rates and densities, which are averaged over the covered target area
+    :return: sparse (target features x source features) weight matrix
+    """
+    areas = overlap.areas
+    if extensive:
+        return (areas @ sparse.diags(_reciprocal(overlap.source_area))).tocsr()
+    covered = np.asarray(areas.sum(axis=1)).ravel()
+    return (sparse.diags(_reciprocal(covered)) @ areas).tocsr()
+
+
+def _reciprocal(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype='float64')
+    return np.divide(1, values, out=np.zeros_like(values), where=values > 0)
+
+
+def interpolate(values: pd.DataFrame, overlap: Overlap, extensive: bool=True) -> pd.DataFrame:
+    """
+    Re-projects every column of values from source to target features with a single sparse
+    matrix product. Source features missing from values count as zero.
+    :param values: DataFrame indexed by source feature id, e.g. a column per year
+    :param overlap: Overlap between the source and target layers
+    :param extensive: True for counts such as population, False for rates and densities
+    :return: DataFrame indexed by target feature id with the columns of values
+    """
+    aligned = values.copy()
+    aligned.index = aligned.index.astype(str)
+    unmatched = aligned.index.difference(overlap.source_ids)
+    if len(unmatched):
+        logging.warning(f"interpolate: No boundaries for {', '.join(unmatched)}, they are left out.")
+    aligned = aligned.reindex(overlap.source_ids).fillna(0).to_numpy(dtype='float64')
+    return pd.DataFrame(
+        weights(overlap, extensive) @ aligned,
+        index=pd.Index(overlap.target_ids, name=values.index.name),
+        columns=values.columns,
+    )
+
+
+def interpolate_stats(
+        stats_fp: str,
+        source_fp: str,
+        target_fp: str,
+        stats_on: str,
+        source_on: str='NAME',
+        target_on: str='NAME',
+        sheet: str or int=None,
+        extensive: bool=True,
+) -> pd.DataFrame:
+    """
+    Interpolates all numeric columns of a statistics table, e.g. every year of population_1900s.csv
+    tied to districts_1929.shp, to another set of boundaries.
+    :param stats_fp: Filepath to non-spatial data (csv, xls, xlsx)
+    :param source_fp: Filepath to the boundaries the statistics are tied to (shapefile)
+    :param target_fp: Filepath to the boundaries to interpolate to (shapefile)
+    :param stats_on: Column of the statistics matching source_on
+    :param sheet: Sheet name or position, first sheet by default
+    :return: DataFrame indexed by target feature id
+    """
+    stats = read_stats(stats_fp, sheet=sheet).dropna(subset=[stats_on]).set_index(stats_on)
+    stats = stats.select_dtypes('number')
+    overlap = overlap_matrix(source_fp, target_fp, source_on=source_on, target_on=target_on)
+    return interpolate(stats, overlap, extensive=extensive)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import tempfile
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import fire
+
+from src.util import read_layer, multipolygons_to_polygons, shp_to_geojson, remove_umlauts
+from src.spatial_index import LayerIndex
+
+
+def _timed(func, *args, repeat=3, **kwargs):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _scaled_layer(layer: gpd.GeoDataFrame, scale: int) -> gpd.GeoDataFrame:
+    """
+    Tiles copies of the layer side by side so that the geometry count grows by factor scale.
+    """
+    width = layer.total_bounds[2] - layer.total_bounds[0]
+    copies = [layer.assign(geometry=layer.geometry.translate(xoff=i * width)) for i in range(scale)]
+    return gpd.GeoDataFrame(pd.concat(copies, ignore_index=True), crs=layer.crs)
+
+
+def bench_explode(fp='water.shp', scales=(1, 10, 100), min_area=0):
+    """
+    Times multipolygons_to_polygons on the layer and on layers tiled up to 100 times its size.
+    """
+    water = read_layer(fp, columns=[])
+    print(f"{'scale':>6} {'rows':>8} {'polygons':>9} {'seconds':>9}")
+    for scale in scales:
+        layer = _scaled_layer(water, scale)
+        seconds, exploded = _timed(multipolygons_to_polygons, layer, min_area=min_area)
+        print(f"{scale:>6} {len(layer):>8} {len(exploded):>9} {seconds:>9.4f}")
+
+
+def _shp_to_geojson_dict(input_fp, geojson_fp, to_epsg=4326):
+    """
+    Previous shp_to_geojson implementation building the whole FeatureCollection in memory, kept as baseline.
+    """
+    data_ = read_layer(input_fp).to_crs(epsg=to_epsg)
+    data_.columns = pd.Index([remove_umlauts(c) for c in data_.columns])
+    data_ = data_.applymap(remove_umlauts)
+    columns = data_.columns.drop('geometry')
+    geojson = {
+        'type': 'FeatureCollection',
+        'features': [],
+    }
+    for _, row in data_.iterrows():
+        point = row['geometry']
+        feature = {
+            'type': 'Feature',
+            'properties': {col: row[col] for col in columns},
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [point.x, point.y]
+            },
+        }
+        geojson['features'].append(feature)
+    with open(geojson_fp, 'w') as fout:
+        json.dump(geojson, fout, indent=2, default=str)
+
+
+def bench_geojson(fp='plots_1878.shp', precision=6):
+    """
+    Compares the streaming shp_to_geojson against the in-memory baseline on plot centroids.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        points_fp = os.path.join(tmp_dir, 'points.shp')
+        plots = read_layer(fp)
+        plots.assign(geometry=plots.geometry.centroid).to_file(points_fp)
+
+        runs = {
+            'dict, indent=2': (_shp_to_geojson_dict, {}),
+            'streaming': (shp_to_geojson, {}),
+            'streaming, rounded': (shp_to_geojson, {'precision': precision}),
+            'streaming, ndjson': (shp_to_geojson, {'newline_delimited': True}),
+        }
+        print(f"{'writer':<20} {'seconds':>9} {'bytes':>10}")
+        for name, (func, kwargs) in runs.items():
+            out_fp = os.path.join(tmp_dir, 'out.geojson')
+            seconds, _ = _timed(func, points_fp, out_fp, **kwargs)
+            print(f"{name:<20} {seconds:>9.4f} {os.path.getsize(out_fp):>10}")
+
+
+def bench_index(files=('plots_1878.shp', 'districts_1929.shp'), points=1_000_000, seed=0):
+    """
+    Times building a LayerIndex and point-in-polygon lookups of random points within each layer's bounds.
+    """
+    if isinstance(files, str):
+        files = [files]
+    seconds, index = _timed(LayerIndex.from_files, files, repeat=1)
+    print(f"index built in {seconds:.3f} s")
+    rng = np.random.default_rng(seed)
+    print(f"{'layer':<20} {'features':>9} {'points':>9} {'inside':>9} {'seconds':>9} {'points/s':>11}")
+    for name, frame in index.frames.items():
+        xmin, ymin, xmax, ymax = frame.total_bounds
+        x = rng.uniform(xmin, xmax, points)
+        y = rng.uniform(ymin, ymax, points)
+        seconds, found = _timed(index.contains_points, name, x, y)
+        print(
+            f"{name:<20} {len(frame):>9} {points:>9} {(found >= 0).sum():>9} "
+            f"{seconds:>9.3f} {points / seconds:>11.0f}"
+        )
+
+
+if __name__ == '__main__':
+    os.chdir('../data')
+    fire.Fire({
+        'explode': bench_explode,
+        'geojson': bench_geojson,
+        'index': bench_index,
+    })
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import ast
+import time
+import hashlib
+import logging
+import argparse
+import importlib
+import multiprocessing
+from collections import namedtuple
+
+from src.util import load_json, dump_json
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+DATA_DIR = os.path.join(ROOT_DIR, 'data')
+FIGURES_DIR = os.path.join(ROOT_DIR, 'figures')
+STATE_FP = os.path.join(FIGURES_DIR, '.build_state.json')
+SHAPEFILE_PARTS = '.shp', '.shx', '.dbf', '.prj'
+
+Target = namedtuple('Target', 'name module inputs outputs function args', defaults=('build', ()))
+Target.__doc__ = """
+Figure build step. module.function(*args) is run in data/ and writes outputs (relative to figures/)
+from inputs (relative to data/).
+"""
+
+TARGETS = [
+    Target(
+        'total_population',
+        'src.total_population',
+        ['population_1799_2011.csv'],
+        ['total_population.html'],
+    ),
+    Target(
+        'language_groups',
+        'src.language_groups',
+        ['lang_groups_1812_1939.csv'],
+        ['language_groups.html'],
+    ),
+    Target(
+        'language_groups_percentages',
+        'src.language_groups_percentages',
+        ['lang_groups_1812_1939.csv'],
+        ['language_groups_percentages.html'],
+    ),
+    Target(
+        'population_karonen',
+        'src.population_karonen',
+        ['population_karonen.csv'],
+        ['population_karonen.html'],
+    ),
+    Target(
+        'population_ruuth',
+        'src.population_ruuth',
+        ['population_ruuth.csv'],
+        ['population_ruuth.html'],
+    ),
+    Target(
+        'vyborg_province_births_deaths',
+        'src.vyborg_province_births_deaths',
+        ['births_deaths.csv'],
+        ['vyborg_province_births_deaths.html'],
+    ),
+    Target(
+        'plots_1878',
+        'src.plots_1878',
+        ['plots_1878.shp', 'water_clip.shp', 'islands.shp'],
+        ['plots_1878.html'],
+    ),
+    Target(
+        'population_by_district_1800',
+        'src.population_by_district_1800',
+        ['districts.shp', 'population_1870_1890.xlsx', 'water_clip.shp', 'islands.shp'],
+        ['population_by_district.html'],
+    ),
+    Target(
+        'population_by_district_1900',
+        'src.population_by_district_1900',
+        ['districts_1929.shp', 'population_1900s.csv', 'water.shp', 'islands.shp'],
+        ['population_by_district_1900.html'],
+    ),
+    Target(
+        'maps_karonen',
+        'src.maps_karonen',
+        [
+            'population_1570.csv',
+            'population_1630.csv',
+            'population_1700.csv',
+            'districts_1637.shp',
+            'districts_1703.shp',
+            'water_1698.shp',
+            'islands_1698.shp',
+        ],
+        ['karonen.html'],
+        'build_html',
+    ),
+    Target(
+        'maps_karonen_1570',
+        'src.maps_karonen',
+        ['population_1570.csv', 'districts_1637.shp', 'water_1698.shp', 'islands_1698.shp'],
+        ['1570.png'],
+        'export_map',
+        ('1570',),
+    ),
+    Target(
+        'maps_karonen_1630',
+        'src.maps_karonen',
+        ['population_1630.csv', 'districts_1703.shp', 'water_1698.shp', 'islands_1698.shp'],
+        ['1630.png'],
+        'export_map',
+        ('1630',),
+    ),
+    Target(
+        'maps_karonen_1700',
+        'src.maps_karonen',
+        ['population_1700.csv', 'districts_1703.shp', 'water_1698.shp', 'islands_1698.shp'],
+        ['1700.png'],
+        'export_map',
+        ('1700',),
+    ),
+]
+
+
+def module_files(module: str, seen: set=None) -> list:
+    """
+    Source files of a src module and of the src modules it imports, recursively.
+    """
+    seen = set() if seen is None else seen
+    module_fp = os.path.join(ROOT_DIR, *module.split('.')) + '.py'
+    if module_fp in seen or not os.path.exists(module_fp):
+        return []
+    seen.add(module_fp)
+    with open(module_fp, encoding='utf-8') as fin:
+        tree = ast.parse(fin.read())
+
+    files = [module_fp]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module:
+            names = [node.module]
+        elif isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        else:
+            continue
+        for name in names:
+            if name.split('.')[0] == 'src':
+                files.extend(module_files(name, seen))
+    return files
+
+
+def input_files(target: Target) -> list:
+    """
+    All files a target depends on: its data files with shapefile sidecars, its module and
+    the src modules that module imports.
+    """
+    files = []
+    for input_fp in target.inputs:
+        base, ending = os.path.splitext(os.path.join(DATA_DIR, input_fp))
+        if ending == '.shp':
+            files.extend(base + part for part in SHAPEFILE_PARTS if os.path.exists(base + part))
+        else:
+            files.append(base + ending)
+    files.extend(module_files(target.module))
+    return files
+
+
+def file_hash(fp: str) -> str:
+    digest = hashlib.sha1()
+    with open(fp, 'rb') as fin:
+        for chunk in iter(lambda: fin.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_hashes(target: Target) -> dict:
+    return {os.path.relpath(fp, ROOT_DIR): file_hash(fp) for fp in input_files(target)}
+
+
+def load_state() -> dict:
+    return load_json(STATE_FP)
+
+
+def save_state(state: dict) -> None:
+    dump_json(STATE_FP, state, indent=2, sort_keys=True)
+
+
+def is_stale(target: Target, state: dict) -> bool:
+    if any(not os.path.exists(os.path.join(FIGURES_DIR, fp)) for fp in target.outputs):
+        return True
+    return state.get(target.name) != input_hashes(target)
+
+
+def build_target(target: Target) -> None:
+    cwd = os.getcwd()
+    os.chdir(DATA_DIR)
+    try:
+        module = importlib.import_module(target.module)
+        getattr(module, target.function)(*target.args)
+    finally:
+        os.chdir(cwd)
+
+
+def _peak_rss_mb() -> float or None:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_target(target: Target) -> tuple:
+    """
+    Builds a target in a pool worker.
+    :return: (target, seconds, peak RSS in MB, error message or None)
+    """
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    error = None
+    try:
+        build_target(target)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return target, time.perf_counter() - start, _peak_rss_mb(), error
+
+
+def build_waves(targets: list) -> list:
+    """
+    Orders targets into waves so that the cached data prepared from an input (layers, columnar
+    stats) is written by a single target: within a wave, every input no earlier wave has used
+    belongs to at most one target. Later targets reading the same inputs find the caches warm.
+    :return: list of lists of targets
+    """
+    waves = []
+    warm = set()
+    pending = list(targets)
+    while pending:
+        wave = []
+        claimed = set()
+        for target in pending:
+            cold = set(target.inputs) - warm
+            if cold & claimed:
+                continue
+            wave.append(target)
+            claimed |= cold
+        pending = [t for t in pending if t not in wave]
+        warm |= claimed
+        waves.append(wave)
+    return waves
+
+
+def build(names=None, force=False, dry_run=False, jobs=1) -> list:
+    """
+    Rebuilds the targets whose inputs changed since their last build. Targets are rendered
+    in a process pool, wave by wave (see build_waves), so that targets sharing inputs never
+    prepare the same cache at the same time. Every worker builds a single target so that
+    its peak RSS is per figure.
+    :param names: Names of targets to consider, all by default
+    :param force: Rebuild even if up to date
+    :param dry_run: Only report which targets would be rebuilt
+    :param jobs: Number of worker processes
+    :return: list of (target name, seconds, peak RSS in MB, error message or None)
+    """
+    state = load_state()
+    targets = [t for t in TARGETS if not names or t.name in names]
+    stale = [t for t in targets if force or is_stale(t, state)]
+    for target in targets:
+        if target not in stale:
+            logging.info(f"build: {target.name} is up to date.")
+    if dry_run:
+        for target in stale:
+            print(f"{target.name}: stale")
+        return []
+
+    results = []
+    with multiprocessing.Pool(processes=jobs, maxtasksperchild=1) as pool:
+        for wave in build_waves(stale):
+            for target, seconds, peak_rss, error in pool.imap_unordered(_run_target, wave):
+                if error:
+                    logging.error(f"build: {target.name} failed: {error}")
+                else:
+                    state[target.name] = input_hashes(target)
+                    save_state(state)
+                results.append((target.name, seconds, peak_rss, error))
+    return results
+
+
+def print_summary(results) -> None:
+    print(f"{'target':<32} {'seconds':>9} {'peak MB':>9}  status")
+    for name, seconds, peak_rss, error in results:
+        peak = f'{peak_rss:.0f}' if peak_rss is not None else '-'
+        print(f"{name:<32} {seconds:>9.2f} {peak:>9}  {'failed' if error else 'ok'}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Rebuild stale atlas figures")
+    parser.add_argument(
+        'targets',
+        nargs='*',
+        help='target names, all by default: ' + ', '.join(t.name for t in TARGETS),
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='rebuild up to date targets too',
+    )
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='only list stale targets',
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count(),
+        help='number of figures built in parallel',
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    results = build(args.targets, force=args.force, dry_run=args.dry_run, jobs=args.jobs)
+    print_summary(results)
+    if any(error for *_, error in results):
+        sys.exit(1)
@@ -0,0 +1,156 @@
+import os
+import io
+import hashlib
+import logging
+import threading
+from typing import Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.util import load_json, dump_json
+
+DATA_DIR = 'https://raw.githubusercontent.com/AnttiHaerkoenen/vyborg_historical_town_atlas/master/data'
+LOCAL_DATA_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data'))
+CACHE_DIR = os.path.join(LOCAL_DATA_DIR, '.cache', 'http')
+
+
+class DataFetcher:
+    """
+    Fetches data files over one pooled HTTP session into a local content-addressed cache.
+    Cached files are revalidated with ETag / Last-Modified, and when the server cannot be
+    reached the cached copy, or failing that the file in local_dir, is used instead.
+    """
+
+    def __init__(
+            self,
+            data_dir: str=DATA_DIR,
+            cache_dir: str=CACHE_DIR,
+            local_dir: str=LOCAL_DATA_DIR,
+            workers: int=8,
+            timeout: float=10,
+            session: requests.Session=None,
+    ):
+        """
+        :param data_dir: Base URL of the data files
+        :param cache_dir: Directory for cached files and their index
+        :param local_dir: Directory used when neither server nor cache has the file
+        :param workers: Number of concurrent requests and pooled connections
+        :param timeout: Request timeout in seconds
+        :param session: requests.Session to use instead of a new pooled one
+        """
+        self.data_dir = data_dir.rstrip('/')
+        self.cache_dir = cache_dir
+        self.local_dir = local_dir
+        self.workers = workers
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        self._index_fp = os.path.join(cache_dir, 'index.json')
+        self._index = load_json(self._index_fp)
+
+    def fetch(self, file: str) -> bytes:
+        """
+        :param file: Filename relative to data_dir
+        :return: file content
+        """
+        url = f'{self.data_dir}/{file}'
+        with self._lock:
+            entry = self._index.get(url)
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and entry:
+                return self._read_object(entry['sha256'])
+            response.raise_for_status()
+        except (requests.RequestException, OSError) as error:
+            logging.warning(f"DataFetcher: {url} could not be fetched ({error}), using local copy.")
+            return self._fetch_offline(file, entry)
+
+        content = response.content
+        sha256 = self._write_object(content)
+        with self._lock:
+            self._index[url] = {
+                'sha256': sha256,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+            self._save_index()
+        return content
+
+    def fetch_many(self, files: Sequence[str]) -> dict:
+        """
+        Fetches files concurrently.
+        :return: dict of filename: content
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(files, pool.map(self.fetch, files)))
+
+    def get_csv(self, file: str) -> io.StringIO:
+        return io.StringIO(self.fetch(file).decode('utf-8'))
+
+    def _fetch_offline(self, file: str, entry: dict or None) -> bytes:
+        if entry:
+            try:
+                return self._read_object(entry['sha256'])
+            except OSError:
+                pass
+        with open(os.path.join(self.local_dir, file), 'rb') as fin:
+            return fin.read()
+
+    def _object_fp(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, 'objects', sha256)
+
+    def _read_object(self, sha256: str) -> bytes:
+        with open(self._object_fp(sha256), 'rb') as fin:
+            return fin.read()
+
+    def _write_object(self, content: bytes) -> str:
+        sha256 = hashlib.sha256(content).hexdigest()
+        object_fp = self._object_fp(sha256)
+        if not os.path.exists(object_fp):
+            os.makedirs(os.path.dirname(object_fp), exist_ok=True)
+            tmp_fp = f'{object_fp}.{threading.get_ident()}.tmp'
+            with open(tmp_fp, 'wb') as fout:
+                fout.write(content)
+            os.replace(tmp_fp, object_fp)
+        return sha256
+
+    def _save_index(self) -> None:
+        dump_json(self._index_fp, self._index, indent=2)
+
+
+_fetchers = {}
+
+
+def get_fetcher(data_dir: str=DATA_DIR) -> DataFetcher:
+    """
+    Returns a shared DataFetcher for data_dir, so that all modules use one connection pool.
+    """
+    if data_dir not in _fetchers:
+        _fetchers[data_dir] = DataFetcher(data_dir)
+    return _fetchers[data_dir]
+
+
+def get_csv(file: str, data_dir: str=DATA_DIR) -> io.StringIO:
+    return get_fetcher(data_dir).get_csv(file)
+
+
+def get_csvs(files: Sequence[str], data_dir: str=DATA_DIR) -> dict:
+    """
+    Fetches many csv files concurrently.
+    :return: dict of filename: io.StringIO
+    """
+    contents = get_fetcher(data_dir).fetch_many(files)
+    return {file: io.StringIO(content.decode('utf-8')) for file, content in contents.items()}
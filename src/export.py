@@ -0,0 +1,121 @@
+import os
+import re
+import json
+import hashlib
+import logging
+
+from bokeh.core.has_props import HasProps
+from bokeh.embed import json_item
+from bokeh.io import export_png, export_svgs
+from bokeh.model import Model
+
+from src.util import load_json, dump_json
+
+EXPORT_FORMATS = 'png', 'svg'
+STATE_DIR = '.export_state'
+
+
+def _model_order(fig) -> dict:
+    """
+    Numbers the models of a figure in a walk over their properties in name order. Unlike the
+    order of fig.references() and of the serialized references, which follows set iteration
+    and changes between processes, the walk only depends on the figure itself.
+    :return: dict of model id: position
+    """
+    order = {}
+    stack = [fig]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, HasProps):
+            if isinstance(value, Model):
+                if value.id in order:
+                    continue
+                order[value.id] = len(order)
+            stack.extend(getattr(value, attr) for attr in sorted(value.properties_with_refs(), reverse=True))
+        elif isinstance(value, (list, tuple)):
+            stack.extend(reversed(value))
+        elif isinstance(value, dict):
+            stack.extend(value[key] for key in sorted(value, key=str, reverse=True))
+    return order
+
+
+def figure_hash(fig) -> str:
+    """
+    Hash of the serialized figure. Model ids depend on creation order within the process, so
+    they are replaced by the position of the model in the figure and the serialized references
+    are put in that order before hashing.
+    """
+    item = json_item(fig)
+    order = _model_order(fig)
+    roots = item['doc']['roots']
+    if isinstance(roots, dict) and 'references' in roots:
+        roots['references'] = sorted(roots['references'], key=lambda ref: order.get(ref['id'], len(order)))
+    text = json.dumps(item, sort_keys=True)
+    if order:
+        pattern = '"({})"'.format('|'.join(re.escape(model_id) for model_id in order))
+        text = re.sub(pattern, lambda m: f'"#{order[m.group(1)]}"', text)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _state_fp(output_dir: str, name: str) -> str:
+    """
+    One state file per figure, so that processes exporting different figures into the same
+    directory never overwrite each other's state.
+    """
+    return os.path.join(output_dir, STATE_DIR, f'{name}.json')
+
+
+def export_figures(
+        figures: dict,
+        output_dir: str='.',
+        formats=EXPORT_FORMATS,
+        force: bool=False,
+) -> list:
+    """
+    Exports figures to PNG and/or SVG with one headless browser session for the whole batch.
+    Figures whose serialized JSON has not changed since their last export are skipped.
+    :param figures: dict of output name (without ending): figure
+    :param output_dir: Directory for the images
+    :param formats: 'png', 'svg' or both
+    :param force: Export unchanged figures too
+    :return: list of written filepaths
+    """
+    pending = []
+    for name, fig in figures.items():
+        digest = figure_hash(fig)
+        filepaths = [os.path.join(output_dir, f'{name}.{ending}') for ending in formats]
+        exported = load_json(_state_fp(output_dir, name)).get('hash')
+        if not force and exported == digest and all(os.path.exists(fp) for fp in filepaths):
+            logging.info(f"export_figures: {name} is unchanged, skipping.")
+            continue
+        pending.append((name, fig, digest))
+
+    written = []
+    if not pending:
+        return written
+
+    # needs selenium, which only image export does
+    from bokeh.io.webdriver import webdriver_control
+
+    webdriver = webdriver_control.create()
+    try:
+        for name, fig, digest in pending:
+            for ending in formats:
+                filepath = os.path.join(output_dir, f'{name}.{ending}')
+                if ending == 'png':
+                    export_png(fig, filename=filepath, webdriver=webdriver)
+                    written.append(filepath)
+                elif ending == 'svg':
+                    backend = fig.output_backend
+                    fig.output_backend = 'svg'
+                    try:
+                        written.extend(export_svgs(fig, filename=filepath, webdriver=webdriver))
+                    finally:
+                        fig.output_backend = backend
+                else:
+                    raise ValueError(f'Incorrect format {ending} (Must be one of {EXPORT_FORMATS})')
+            dump_json(_state_fp(output_dir, name), {'hash': digest})
+            logging.info(f"export_figures: {name} exported.")
+    finally:
+        webdriver.quit()
+    return written
@@ -1,10 +1,54 @@
 #!/usr/bin/env python
 
+import os
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import rasterio
+from rasterio.windows import Window
+from rasterio.enums import Resampling
 import fire
 
 
-def clip_histogram(input_file, output_file, min_val=-32767, max_val=32768):
+def _clip_bounds(dtype, min_val, max_val):
+    """
+    Limits clip values to the range of the raster data type, so that clamping can be done in place.
+    """
+    info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+    return max(min_val, info.min), min(max_val, info.max)
+
+
+def _overview_factors(width, height, blocksize):
+    factors = []
+    factor = 2
+    while max(width, height) / factor >= blocksize:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+def clip_histogram(
+        input_file,
+        output_file,
+        min_val=-32767,
+        max_val=32768,
+        windowed=True,
+        compress='deflate',
+        blocksize=256,
+        overviews=False,
+):
+    """
+    Clamps raster values of all bands to [min_val, max_val]; nodata pixels are left untouched.
+    The output keeps the source profile (CRS, transform, nodata, band count) and is written
+    as a tiled, compressed GeoTIFF.
+    :param windowed: Process the raster one block window at a time, so that
+        peak memory is bounded by the block size instead of the image size
+    :param compress: 'deflate', 'lzw' or None for uncompressed output
+    :param blocksize: Tile width and height of the output, multiple of 16
+    :param overviews: Build internal overviews down to single tile size
+    """
     if max_val not in range(-32767, 32768):
         max_val = 32768
 
@@ -13,28 +57,35 @@ def clip_histogram(input_file, output_file, min_val=-32767, max_val=32768):
 
     try:
         with rasterio.open(input_file, driver='GTiff') as fin:
-            b = fin.read(1)
-            image = fin.read()
-            h, w = fin.shape
-            m1 = image < min_val
-            m2 = image > max_val
-            image[m1] = min_val
-            image[m2] = max_val
-            dtype_ = b.dtype
-    except IOError as ioe:
-        raise ioe
+            low, high = _clip_bounds(np.dtype(fin.dtypes[0]), min_val, max_val)
+            profile = fin.profile.copy()
+            profile.update(
+                driver='GTiff',
+                tiled=True,
+                blockxsize=blocksize,
+                blockysize=blocksize,
+            )
+            profile.pop('compress', None)
+            if compress:
+                profile['compress'] = compress
+            # scanned sheets are often JPEG compressed YCbCr, which GDAL only writes with JPEG
+            if str(profile.get('photometric', '')).lower() == 'ycbcr' and str(compress).lower() != 'jpeg':
+                profile['photometric'] = 'rgb'
 
-    try:
-        with rasterio.open(
-            output_file,
-            'w',
-            driver='GTiff',
-            width=w,
-            height=h,
-            count=1,
-            dtype=dtype_
-        ) as fout:
-            fout.write(image)
+            with rasterio.open(output_file, 'w', **profile) as fout:
+                if windowed:
+                    windows = [window for _, window in fout.block_windows(1)]
+                else:
+                    windows = [Window(0, 0, fin.width, fin.height)]
+                for window in windows:
+                    block = fin.read(window=window, masked=True)
+                    # only valid pixels are clamped, nodata stays nodata
+                    np.clip(block.data, low, high, out=block.data, where=~np.ma.getmaskarray(block))
+                    fout.write(block.data, window=window)
+
+                if overviews:
+                    fout.build_overviews(_overview_factors(fin.width, fin.height, blocksize), Resampling.average)
+                    fout.update_tags(ns='rio_overview', resampling='average')
     except IOError as ioe:
         raise ioe
     except TypeError as tye:
@@ -43,5 +94,58 @@ def clip_histogram(input_file, output_file, min_val=-32767, max_val=32768):
     print("Raster manipulation successful.")
 
 
+def _raster_files(inputs):
+    if os.path.isdir(inputs):
+        return sorted(glob.glob(os.path.join(inputs, '*.tif')) + glob.glob(os.path.join(inputs, '*.tiff')))
+    return sorted(glob.glob(inputs))
+
+
+def _raster_megabytes(fp):
+    with rasterio.open(fp) as src:
+        return src.width * src.height * src.count * np.dtype(src.dtypes[0]).itemsize / 1e6
+
+
+def clip_histograms(inputs, output_dir, min_val=-32767, max_val=32768, workers=4, **kwargs):
+    """
+    Clips every GeoTIFF matched by a glob pattern or found in a directory. Files are processed
+    concurrently in a thread pool; rasterio releases the GIL during block reads and writes,
+    so I/O and clamping of different files overlap.
+    :param inputs: Directory or glob pattern of GeoTIFFs
+    :param output_dir: Directory for clipped rasters, created if missing; must not hold the inputs
+    :param workers: Number of threads
+    :param kwargs: Additional arguments for clip_histogram
+    :return: list of (input file, megabytes, seconds)
+    """
+    files = _raster_files(inputs)
+    real_output_dir = os.path.realpath(output_dir)
+    for input_file in files:
+        if os.path.dirname(os.path.realpath(input_file)) == real_output_dir:
+            raise ValueError(f'Output directory {output_dir} contains input {input_file}, it would be overwritten')
+    os.makedirs(output_dir, exist_ok=True)
+
+    def clip_one(input_file):
+        start = time.perf_counter()
+        output_file = os.path.join(output_dir, os.path.basename(input_file))
+        clip_histogram(input_file, output_file, min_val=min_val, max_val=max_val, **kwargs)
+        return input_file, _raster_megabytes(input_file), time.perf_counter() - start
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for input_file, megabytes, seconds in pool.map(clip_one, files):
+            print(f"{input_file}: {megabytes:.1f} MB in {seconds:.2f} s ({megabytes / seconds:.1f} MB/s)")
+            results.append((input_file, megabytes, seconds))
+    return results
+
+
+def clip_rasters(input_file, output_file, min_val=-32767, max_val=32768, workers=4, **kwargs):
+    """
+    Command line entry point. A single GeoTIFF is clipped to output_file; a directory or glob
+    pattern is clipped concurrently into directory output_file.
+    """
+    if os.path.isfile(input_file):
+        return clip_histogram(input_file, output_file, min_val=min_val, max_val=max_val, **kwargs)
+    clip_histograms(input_file, output_file, min_val=min_val, max_val=max_val, workers=workers, **kwargs)
+
+
 if __name__ == '__main__':
-    fire.Fire(clip_histogram)
+    fire.Fire(clip_rasters)
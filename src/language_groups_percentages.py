@@ -1,14 +1,13 @@
 import os
 
 import pandas as pd
-from bokeh.io import show, output_file
+from bokeh.io import show, save, output_file
 from bokeh.palettes import Colorblind5
 from bokeh.models import ColumnDataSource, HoverTool
 from bokeh.plotting import figure
 
 
-if __name__ == '__main__':
-    os.chdir(r'../data')
+def build():
     palette = Colorblind5
 
     lang_groups = pd.read_csv('lang_groups_1812_1939.csv', index_col=0).fillna(0)
@@ -61,4 +60,10 @@ if __name__ == '__main__':
 
     fig.add_tools(hover)
     output_file(r'../figures/language_groups_percentages.html')
-    show(fig)
+    save(fig)
+    return fig
+
+
+if __name__ == '__main__':
+    os.chdir(r'../data')
+    show(build())
@@ -5,18 +5,17 @@ from collections import namedtuple
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-from bokeh.plotting import figure, show, output_file
+from bokeh.plotting import figure, show, save, output_file
 from bokeh.layouts import gridplot
 from bokeh.palettes import Category10_10
-from bokeh.io import export_png, export_svgs
 from bokeh.models import (
     HoverTool,
     LabelSet,
-    GeoJSONDataSource,
     ColumnDataSource,
     VBar)
 
 from src.util import *
+from src.export import export_figures
 
 Coordinates = namedtuple('Coordinates', 'x y')
 
@@ -132,45 +131,20 @@ def draw_population_map(
     kinds = 'mosaic', 'stacked bar', 'bar'
     if kind not in kinds:
         raise ValueError(f'Incorrect type parameter (Must be one of {kinds})')
-    data_ = pd.read_csv(population_file, index_col=0)
+    data_ = read_stats(population_file)
+    data_ = data_.set_index(data_.columns[0])
     totals = data_.sum(axis=0)
     palette = Category10_10[:len(data_)]
     data_['colors'] = palette
     groups = [g for g in data_.index]
 
-    water = gpd.read_file(water_file)
-    water = get_xy(multipolygons_to_polygons(water))
-    water_src = GeoJSONDataSource(geojson=water.to_json())
-
-    islands = gpd.read_file(islands_file)
-    islands = get_xy(multipolygons_to_polygons(islands))
-    islands_src = GeoJSONDataSource(geojson=islands.to_json())
-
-    districts = gpd.read_file(districts_file)
-    districts = get_xy(districts)
-    districts_src = GeoJSONDataSource(geojson=districts.to_json())
-
     fig = figure(**kwargs)
 
     fig.grid.grid_line_color = None
+    districts = read_prepared_layer(districts_file, columns=[]).frame
+    districts_src = patches_source(simplify_for_view(districts, figure_view(fig), name=districts_file, coverage=True))
 
-    fig.patches(
-        xs='x',
-        ys='y',
-        source=water_src,
-        fill_color='#59d0ff',
-        fill_alpha=0.8,
-        line_color=None,
-        line_width=0,
-    )
-    fig.patches(
-        xs='x',
-        ys='y',
-        source=islands_src,
-        fill_color='white',
-        line_color=None,
-        line_width=0,
-    )
+    draw_base_map(fig, water_file=water_file, islands_file=islands_file)
     fig.patches(
         xs='x',
         ys='y',
@@ -251,39 +225,30 @@ def draw_population_map(
     return fig
 
 
-def main():
-    os.chdir(r'../data')
-    width = 0.00025
-    height = 0.0025
-    label_font_size = "11pt"
-    add_legend = False
-    legend_font_size = "24pt"
-    legend_spacing = 20
-    legend_padding = 20
-    kwargs = dict(
-        water_file='water_1698.shp',
-        islands_file='islands_1698.shp',
-        plot_height=2400,
-        plot_width=2400,
-        x_axis_location=None,
-        y_axis_location=None,
-        # output_backend='svg',
-    )
-
-    fig1 = draw_population_map(
+MAP_KWARGS = dict(
+    width=0.00025,
+    height=0.0025,
+    kind='bar',
+    label_font_size="11pt",
+    add_legend=False,
+    legend_font_size="24pt",
+    legend_spacing=20,
+    legend_padding=20,
+    water_file='water_1698.shp',
+    islands_file='islands_1698.shp',
+    plot_height=2400,
+    plot_width=2400,
+    x_axis_location=None,
+    y_axis_location=None,
+    # output_backend='svg',
+)
+
+MAPS = {
+    '1570': dict(
         population_file='population_1570.csv',
         districts_file='districts_1637.shp',
         y_range=(60.705, 60.717),
         x_range=(28.722, 28.743),
-        title='1570',
-        width=width,
-        height=height,
-        kind='bar',
-        label_font_size=label_font_size,
-        add_legend=add_legend,
-        legend_font_size=legend_font_size,
-        legend_padding=legend_padding,
-        legend_spacing=legend_spacing,
         locations={
             'i': Coordinates(28.73, 60.7125),
             'ii': Coordinates(28.732, 60.7105),
@@ -291,62 +256,60 @@ def main():
             'iv': Coordinates(28.734, 60.713),
             'Valli': Coordinates(28.737, 60.7105),
         },
-        **kwargs
-    )
-    fig2 = draw_population_map(
+    ),
+    '1630': dict(
         population_file='population_1630.csv',
         districts_file='districts_1703.shp',
         y_range=(60.705, 60.718),
         x_range=(28.72, 28.743),
-        title='1630',
-        width=width,
-        height=height,
-        label_font_size=label_font_size,
-        add_legend=add_legend,
-        legend_font_size=legend_font_size,
-        legend_padding=legend_padding,
-        legend_spacing=legend_spacing,
-        kind='bar',
         locations={
             'Linnoitus': Coordinates(28.732, 60.712),
             'Siikaniemi': Coordinates(28.724, 60.712),
             'Valli': Coordinates(28.737, 60.710),
             'Pantsarlahti': Coordinates(28.738, 60.7057),
         },
-        **kwargs
-    )
-    fig3 = draw_population_map(
+    ),
+    '1700': dict(
         population_file='population_1700.csv',
         districts_file='districts_1703.shp',
         y_range=(60.705, 60.718),
         x_range=(28.72, 28.743),
-        title='1700',
-        width=width,
-        height=height,
-        label_font_size=label_font_size,
-        add_legend=add_legend,
-        legend_font_size=legend_font_size,
-        legend_padding=legend_padding,
-        legend_spacing=legend_spacing,
-        kind='bar',
         locations={
             'Linnoitus': Coordinates(28.732, 60.712),
             'Siikaniemi': Coordinates(28.724, 60.712),
             'Valli': Coordinates(28.737, 60.710),
             'Pantsarlahti': Coordinates(28.738, 60.7059),
         },
-        **kwargs
-    )
+    ),
+}
+
+
+def draw_map(year: str):
+    return draw_population_map(title=year, **MAP_KWARGS, **MAPS[year])
+
 
-    os.chdir(r'../figures')
-    # export_svgs(fig1, filename="1570.svg")
-    # export_svgs(fig2, filename="1630.svg")
-    # export_svgs(fig3, filename="1700.svg")
-    export_png(fig1, filename="1570.png")
-    export_png(fig2, filename="1630.png")
-    export_png(fig3, filename="1700.png")
-    output_file(r'karonen.html')
-    show(gridplot([fig1, fig2, fig3], ncols=1))
+def export_map(year: str, formats=('png',)):
+    export_figures({year: draw_map(year)}, output_dir='../figures', formats=formats)
+
+
+def build_html(figs=None):
+    if figs is None:
+        figs = [draw_map(year) for year in MAPS]
+    output_file(r'../figures/karonen.html')
+    layout = gridplot(figs, ncols=1)
+    save(layout)
+    return layout
+
+
+def build(formats=('png',)):
+    figs = [draw_map(year) for year in MAPS]
+    export_figures(dict(zip(MAPS, figs)), output_dir='../figures', formats=formats)
+    return build_html(figs)
+
+
+def main():
+    os.chdir(r'../data')
+    show(build())
 
 
 if __name__ == '__main__':
@@ -5,9 +5,17 @@ import geopandas as gpd
 from bokeh.plotting import figure, show, output_file, save
 from bokeh.palettes import Category10_9 as palette
 from bokeh.transform import factor_cmap
-from bokeh.models import HoverTool, GeoJSONDataSource
-
-from src.util import multipolygons_to_polygons, get_xy
+from bokeh.models import HoverTool
+
+from src.util import (
+    get_xy,
+    read_layer,
+    read_prepared_layer,
+    patches_source,
+    simplify_for_view,
+    figure_view,
+    draw_base_map,
+)
 
 district_name_mapper_fi = {
     '1': "Linnoitus",
@@ -35,40 +43,50 @@ district_name_mapper_en = {
 
 district_name_mapper = district_name_mapper_en
 
+PLOTS_COLUMNS = ['DISTRICT', 'NUMBER']
 
-def mk_plots_folium(fp_plots, title=None):
-    import folium
 
-    plots = gpd.read_file(fp_plots)
-    plots = get_xy(plots)
-    plots['district_name'] = plots.DISTRICT.map(district_name_mapper)
+def mk_plots_folium(fp_plots, title=None, tiles_url=None, basemap_url=None):
+    """
+    :param fp_plots: Filepath to the plots shapefile
+    :param title: Not used
+    :param tiles_url: URL template of vector tiles built by src.vector_tiles in pbf format,
+        e.g. 'tiles/plots_1878/{z}/{x}/{y}.pbf'; the layer is embedded as GeoJSON by default
+    :param basemap_url: URL template of raster tiles built by src.raster_tiles, e.g. the scanned
+        1878 plan at 'tiles/plan_1878/{z}/{x}/{y}.png'; OpenStreetMap by default
+    """
+    import folium
 
     map_ = folium.Map(
         location=[60.71, 28.73],
         zoom_start=14,
-        tiles='Stamen Terrain',
+        tiles=basemap_url or 'OpenStreetMap',
+        attr='Viipuri 1878' if basemap_url else None,
     )
-    folium.GeoJson(
-        plots.to_json()
-    ).add_to(map_)
+    if tiles_url:
+        from folium.plugins import VectorGridProtobuf
+
+        layer_name = os.path.splitext(os.path.basename(fp_plots))[0]
+        VectorGridProtobuf(
+            tiles_url,
+            layer_name,
+            {'vectorTileLayerStyles': {layer_name: {'weight': 1, 'fill': True}}},
+        ).add_to(map_)
+    else:
+        plots = read_layer(fp_plots, columns=PLOTS_COLUMNS)
+        plots = get_xy(plots)
+        plots['district_name'] = plots.DISTRICT.map(district_name_mapper)
+        folium.GeoJson(
+            plots.to_json()
+        ).add_to(map_)
     folium.LayerControl().add_to(map_)
 
     return map_
 
 
 def plot_plots_bokeh(fp_plots, title=None, **kwargs):
-    water = gpd.read_file('water_clip.shp')
-    water = get_xy(multipolygons_to_polygons(water))
-    water_src = GeoJSONDataSource(geojson=water.to_json())
-
-    islands = gpd.read_file('islands.shp')
-    islands = get_xy(multipolygons_to_polygons(islands))
-    islands_src = GeoJSONDataSource(geojson=islands.to_json())
-
-    plots = gpd.read_file(fp_plots)
-    plots = get_xy(plots)
+    plots = read_prepared_layer(fp_plots, columns=PLOTS_COLUMNS).frame
     plots['district_name'] = plots.DISTRICT.map(district_name_mapper)
-    plots_src = GeoJSONDataSource(geojson=plots.to_json())
 
     factors = list(district_name_mapper.values())
     color_mapper = factor_cmap(
@@ -88,24 +106,9 @@ def plot_plots_bokeh(fp_plots, title=None, **kwargs):
     if title:
         fig.title.text_font_size = "20px"
     fig.grid.grid_line_color = None
+    plots_src = patches_source(simplify_for_view(plots, figure_view(fig), name=fp_plots, coverage=True))
 
-    fig.patches(
-        xs='x',
-        ys='y',
-        source=water_src,
-        fill_color='#59d0ff',
-        fill_alpha=0.8,
-        line_color=None,
-        line_width=0,
-    )
-    fig.patches(
-        xs='x',
-        ys='y',
-        source=islands_src,
-        fill_color='white',
-        line_color=None,
-        line_width=0
-    )
+    draw_base_map(fig, water_file='water_clip.shp', islands_file='islands.shp')
     plots_patch = fig.patches(
         xs='x',
         ys='y',
@@ -132,12 +135,7 @@ def plot_plots_bokeh(fp_plots, title=None, **kwargs):
     return fig
 
 
-if __name__ == '__main__':
-    logging.basicConfig(level=logging.INFO)
-    os.chdir(r'../data')
-    # fol = mk_plots_folium('plots_1878.shp')
-    # os.chdir(r'../figures')
-    # fol.save('folium.html')
+def build():
     fig = plot_plots_bokeh(
         'plots_1878.shp',
         plot_height=400,
@@ -145,4 +143,14 @@ if __name__ == '__main__':
     )
     output_file(r'../figures/plots_1878.html')
     save(fig)
+    return fig
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    os.chdir(r'../data')
+    # fol = mk_plots_folium('plots_1878.shp')
+    # os.chdir(r'../figures')
+    # fol.save('folium.html')
+    build()
     # show(fig)
@@ -1,17 +1,17 @@
 import os
 import logging
 from datetime import datetime
+from functools import lru_cache
 import time
 
 import geopandas as gpd
 import pandas as pd
 import numpy as np
-from bokeh.plotting import figure, show, output_file
+from bokeh.plotting import figure, show, save, output_file
 from bokeh.layouts import gridplot
 from bokeh.palettes import magma
 from bokeh.models import (
     HoverTool,
-    GeoJSONDataSource,
     LinearColorMapper,
     Title,
     ColorBar,
@@ -21,6 +21,33 @@ from bokeh.models import (
 from src.util import *
 
 
+KIELET = ['suomi', 'ruotsi', 'venaja', 'saksa', 'ranska', 'englanti', 'viro',
+          'unkari', 'jiddish', 'tataari', 'romani', 'ilmoittamatta']
+
+
+@lru_cache(maxsize=None)
+def districts_by_year() -> gpd.GeoDataFrame:
+    """
+    Joins the yearly sheets of population_1870_1890.xlsx onto one load of the districts
+    and computes language group percentages for all years at once.
+    :return: long year x district table
+    """
+    districts = combine_sheets(
+        'districts.shp',
+        'population_1870_1890.xlsx',
+        sheets=['1870', '1880', '1890'],
+        shp_on='NAME',
+        stats_on='Kaupunginosa',
+        key='year',
+        shp_columns=['NAME'],
+        how='left'
+    )
+    districts.columns = pd.Index([remove_umlauts(col.lower()) for col in districts.columns])
+    pct = districts[KIELET].div(districts['yhteensa'], axis=0) * 100
+    pct.columns = [f'{col}_pct' for col in KIELET]
+    return districts.join(pct)
+
+
 def plot_population_by_district(
         year,
         group,
@@ -36,34 +63,10 @@ def plot_population_by_district(
     palette = list(reversed(palette))
     year = str(year)
 
-    water = gpd.read_file('water_clip.shp')
-    water = get_xy(multipolygons_to_polygons(water))
-    water_src = GeoJSONDataSource(geojson=water.to_json())
-
-    islands = gpd.read_file('islands.shp')
-    islands = get_xy(multipolygons_to_polygons(islands))
-    islands_src = GeoJSONDataSource(geojson=islands.to_json())
-
-    districts = combine_data(
-        'districts.shp',
-        'population_1870_1890.xlsx',
-        sheet=year,
-        shp_on='NAME',
-        stats_on='Kaupunginosa',
-        how='left'
-    )
-    districts.columns = pd.Index([remove_umlauts(col.lower()) for col in districts.columns])
-
-    kielet = ['suomi', 'ruotsi', 'venaja', 'saksa', 'ranska', 'englanti', 'viro',
-                'unkari', 'jiddish', 'tataari', 'romani', 'ilmoittamatta']
-    for col in kielet:
-        districts[f'{col}_pct'] = districts[col] / districts['yhteensa'] * 100
-
-    districts = districts[districts['yhteensa'] > 0]
-    districts = get_xy(districts)
+    districts = districts_by_year()
+    districts = districts[(districts['year'] == year) & (districts['yhteensa'] > 0)]
     districts = districts.fillna(0)
 
-    districts_src = GeoJSONDataSource(geojson=districts.to_json())
     color_mapper = LinearColorMapper(
         palette=palette,
         low=low,
@@ -79,27 +82,12 @@ def plot_population_by_district(
     )
     fig.title.text_font_size = "20px"
     fig.grid.grid_line_color = None
+    districts_src = patches_source(simplify_for_view(districts, figure_view(fig), name='districts', coverage=True))
     pvm = datetime.date(datetime.now())
     if copyright_:
         fig.add_layout(Title(text=f"© Antti Härkönen {pvm}", align="left"), "below")
 
-    fig.patches(
-        xs='x',
-        ys='y',
-        source=water_src,
-        fill_color='#59d0ff',
-        fill_alpha=0.8,
-        line_color=None,
-        line_width=0,
-    )
-    fig.patches(
-        xs='x',
-        ys='y',
-        source=islands_src,
-        fill_color='white',
-        line_color=None,
-        line_width=0
-    )
+    draw_base_map(fig, water_file='water_clip.shp', islands_file='islands.shp')
     district_patch = fig.patches(
         xs='x',
         ys='y',
@@ -140,10 +128,7 @@ def plot_population_by_district(
     return fig
 
 
-if __name__ == '__main__':
-    os.chdir('..\data')
-    logging.basicConfig(level=logging.INFO)
-    set_gdal()
+def build():
     group = 'suomi_pct'
     min_ = 40
     max_ = 90
@@ -184,4 +169,13 @@ if __name__ == '__main__':
     )
 
     output_file(r'../figures/population_by_district.html')
-    show(gridplot([fig1, fig2, fig3], ncols=1))
+    layout = gridplot([fig1, fig2, fig3], ncols=1)
+    save(layout)
+    return layout
+
+
+if __name__ == '__main__':
+    os.chdir('..\data')
+    logging.basicConfig(level=logging.INFO)
+    set_gdal()
+    show(build())
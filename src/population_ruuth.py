@@ -1,13 +1,12 @@
 import os
 
 import pandas as pd
-from bokeh.io import show, output_file
+from bokeh.io import show, save, output_file
 from bokeh.models import ColumnDataSource, HoverTool
 from bokeh.plotting import figure
 
 
-if __name__ == '__main__':
-    os.chdir('../data')
+def build():
     population = pd.read_csv('population_ruuth.csv', index_col=0)
     population.interpolate(method='linear', inplace=True)
     source = ColumnDataSource(population)
@@ -48,4 +47,10 @@ if __name__ == '__main__':
     fig.legend.location = 'top_left'
 
     output_file(r'../figures/population_ruuth.html')
-    show(fig)
+    save(fig)
+    return fig
+
+
+if __name__ == '__main__':
+    os.chdir('../data')
+    show(build())
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import os
+import math
+import time
+import warnings
+import multiprocessing
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling, ColorInterp
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.transform import from_bounds
+from rasterio.warp import reproject, transform_bounds
+import fire
+
+from src.tile_grid import MERCATOR_ORIGIN, WEB_MERCATOR, tile_bounds, tile_range
+
+TILE_SIZE = 256
+TILE_FORMATS = {'png': 'PNG', 'webp': 'WEBP'}
+
+_source = None
+
+
+def native_zoom(src) -> int:
+    """
+    :return: Lowest zoom level whose pixels are at least as fine as the pixels of the raster
+    """
+    xmin, ymin, xmax, ymax = transform_bounds(src.crs, WEB_MERCATOR, *src.bounds)
+    resolution = min((xmax - xmin) / src.width, (ymax - ymin) / src.height)
+    return max(0, math.ceil(math.log2(2 * MERCATOR_ORIGIN / (TILE_SIZE * resolution))))
+
+
+def _tile_path(output_dir: str, tile: tuple, tile_format: str) -> str:
+    zoom, x, y = tile
+    return os.path.join(output_dir, str(zoom), str(x), f'{y}.{tile_format}')
+
+
+def _init_source(input_file, output_dir, tile_format, resampling):
+    global _source
+    _source = rasterio.open(input_file), output_dir, tile_format, resampling
+
+
+def _alpha_band(src) -> int:
+    """
+    :return: Index of the alpha band of a grey + alpha or RGBA raster, 0 if there is none
+    """
+    if src.count in (2, 4) and src.colorinterp[-1] == ColorInterp.alpha:
+        return src.count
+    return 0
+
+
+def _render_tile(tile: tuple) -> bool:
+    """
+    Warps the part of the source raster under a tile into a 256 x 256 RGBA tile. Pixels outside
+    the raster, nodata and masked pixels, and pixels transparent in its alpha band are left
+    transparent. Only the source windows the tile needs are read, and tiles without any data
+    are not written.
+    :return: True if the tile was written
+    """
+    src, output_dir, tile_format, resampling = _source
+    bands = [1, 2, 3] if src.count >= 3 else [1, 1, 1]
+    rgba = np.zeros((4, TILE_SIZE, TILE_SIZE), dtype=np.uint8)
+    reproject(
+        source=rasterio.band(src, bands),
+        destination=rgba,
+        dst_transform=from_bounds(*tile_bounds(*tile), TILE_SIZE, TILE_SIZE),
+        dst_crs=WEB_MERCATOR,
+        src_alpha=_alpha_band(src),
+        dst_alpha=4,
+        resampling=Resampling[resampling],
+    )
+    if not rgba[3].any():
+        return False
+
+    tile_fp = _tile_path(output_dir, tile, tile_format)
+    os.makedirs(os.path.dirname(tile_fp), exist_ok=True)
+    # written under a temporary name, so that an interrupted run leaves no partial tiles behind
+    tmp_fp = f'{tile_fp}.{os.getpid()}.tmp'
+    # tiles are placed by their path, the PNG itself carries no georeferencing
+    with rasterio.Env(GDAL_PAM_ENABLED='NO'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', NotGeoreferencedWarning)
+        with rasterio.open(
+                tmp_fp,
+                'w',
+                driver=TILE_FORMATS[tile_format],
+                width=TILE_SIZE,
+                height=TILE_SIZE,
+                count=4,
+                dtype='uint8',
+        ) as fout:
+            fout.write(rgba)
+    os.replace(tmp_fp, tile_fp)
+    return True
+
+
+def tile_raster(
+        input_file,
+        output_dir=None,
+        min_zoom=12,
+        max_zoom=None,
+        tile_format='png',
+        resampling='bilinear',
+        processes=None,
+        chunksize=16,
+):
+    """
+    Cuts a georeferenced 8-bit raster, such as a scanned historical map, into an XYZ tile pyramid
+    in output_dir/{z}/{x}/{y}.<tile_format>. Tiles are rendered in a process pool, every worker
+    keeping the raster open and reading only the windows under its tiles. Tiles that already exist
+    are skipped, so an interrupted run continues where it stopped.
+    :param input_file: Georeferenced raster with grey or RGB 8-bit bands, optionally with an alpha band
+    :param output_dir: Directory of the tile pyramid, ../figures/tiles/<raster name> by default
+    :param min_zoom: Lowest zoom level
+    :param max_zoom: Highest zoom level, the native resolution of the raster by default
+    :param tile_format: 'png' or 'webp'
+    :param resampling: rasterio resampling method name
+    :param processes: Number of worker processes, all CPUs by default
+    :param chunksize: Tiles handed to a worker at a time
+    :return: (tiles written, tiles skipped, seconds)
+    """
+    if tile_format not in TILE_FORMATS:
+        raise ValueError(f'Incorrect format {tile_format} (Must be one of {tuple(TILE_FORMATS)})')
+    if output_dir is None:
+        output_dir = os.path.join('../figures/tiles', os.path.splitext(os.path.basename(input_file))[0])
+
+    with rasterio.open(input_file) as src:
+        if src.dtypes[0] != 'uint8':
+            raise ValueError(f'{input_file} is {src.dtypes[0]}, tiles need 8-bit bands')
+        if max_zoom is None:
+            max_zoom = native_zoom(src)
+        bounds = transform_bounds(src.crs, WEB_MERCATOR, *src.bounds)
+
+    tiles = []
+    skipped = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        x0, y0, x1, y1 = tile_range(bounds, zoom)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                if os.path.exists(_tile_path(output_dir, (zoom, x, y), tile_format)):
+                    skipped += 1
+                else:
+                    tiles.append((zoom, x, y))
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(
+            processes=processes,
+            initializer=_init_source,
+            initargs=(input_file, output_dir, tile_format, resampling),
+    ) as pool:
+        written = sum(pool.imap_unordered(_render_tile, tiles, chunksize=chunksize))
+    seconds = time.perf_counter() - start
+
+    print(
+        f"{input_file}: zoom {min_zoom}-{max_zoom}, {written} tiles written, {skipped} skipped "
+        f"in {seconds:.2f} s ({len(tiles) / seconds if seconds else 0:.1f} tiles/s)"
+    )
+    return written, skipped, seconds
+
+
+if __name__ == '__main__':
+    fire.Fire(tile_raster)
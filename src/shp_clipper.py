@@ -1,41 +1,131 @@
 #!/usr/bin/env python
 
 import os
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+import shapely
 import geopandas as gpd
 
+from src.util import read_layer
+
+_clip = None
+
+
+def prepare_clip_geometry(clip_file, crs=None):
+    """
+    Reads the clip layer, unions it and prepares the union for repeated predicate tests.
+    :return: (clip geometry, CRS of clip geometry)
+    """
+    clip: gpd.GeoDataFrame = read_layer(clip_file, columns=[])
+    if crs is not None and clip.crs != crs:
+        clip = clip.to_crs(crs)
+
+    clip_poly = shapely.union_all(np.asarray(clip.geometry))
+    shapely.prepare(clip_poly)
+    return clip_poly, clip.crs
+
+
+def clip_frame(target: gpd.GeoDataFrame, clip_poly) -> gpd.GeoDataFrame:
+    """
+    Clips target features to a prepared clip geometry. Candidates are prefiltered by
+    bounding box with an STRtree, and features lying fully inside are passed through unchanged.
+    """
+    geoms = np.asarray(target.geometry)
+    tree = shapely.STRtree(geoms)
+    candidates = np.sort(tree.query(clip_poly, predicate='intersects'))
+
+    target = target.iloc[candidates].copy()
+    geoms = geoms[candidates]
+    on_edge = ~shapely.contains_properly(clip_poly, geoms)
+    geoms[on_edge] = shapely.intersection(geoms[on_edge], clip_poly)
+    target[target.geometry.name] = geoms
+    return target
+
 
 def clip_shp(
         input_file,
-        clip_file,
+        clip_file=None,
         output_file=None,
+        clip_poly=None,
+        clip_crs=None,
 ):
+    """
+    Clips a shapefile with the clip layer in clip_file, or with an already prepared clip_poly.
+    :return: number of features written, None if input_file is the clip file
+    """
     if input_file == clip_file:
-        return
+        return None
     if not output_file:
-        if not os.path.isdir(r"./clipped"):
-            os.mkdir(r"clipped")
+        os.makedirs(r"clipped", exist_ok=True)
         input_file_basename = os.path.basename(input_file).split('.')[0]
         output_file = f"clipped/{input_file_basename}.shp"
 
-    target: gpd.GeoDataFrame = gpd.read_file(input_file)
-    clip: gpd.GeoDataFrame = gpd.read_file(clip_file)
-
-    if target.crs != clip.crs:
-        clip = clip.to_crs(target.crs)
-
-    clip_poly = clip.geometry.unary_union
-    target = target[target.geometry.intersects(clip_poly)]
-    target['geometry'] = target['geometry'].intersection(clip_poly)
+    target: gpd.GeoDataFrame = read_layer(input_file)
+    if clip_poly is None:
+        clip_poly, clip_crs = prepare_clip_geometry(clip_file, target.crs)
+    elif clip_crs is not None and target.crs != clip_crs:
+        clip_poly = gpd.GeoSeries([clip_poly], crs=clip_crs).to_crs(target.crs).iloc[0]
+        shapely.prepare(clip_poly)
+    target = clip_frame(target, clip_poly)
 
     if target.empty:
         print(f"{input_file}: No features in clip area")
     else:
         target.to_file(output_file)
         print(f"{input_file}: Clipping successful")
+    return len(target)
+
+
+def _init_clip(clip_poly, clip_crs):
+    global _clip
+    shapely.prepare(clip_poly)
+    _clip = clip_poly, clip_crs
+
+
+def _clip_one(input_file, output_file=None):
+    start = time.perf_counter()
+    clip_poly, clip_crs = _clip
+    count = clip_shp(
+        input_file,
+        output_file=output_file,
+        clip_poly=clip_poly,
+        clip_crs=clip_crs,
+    )
+    return input_file, count, time.perf_counter() - start
+
+
+def clip_many(files, clip_file, jobs=1, output_file=None):
+    """
+    Clips many shapefiles with one clip layer, which is read and unioned only once.
+    With jobs > 1 targets are clipped in parallel in a process pool.
+    :return: list of (input file, feature count, seconds)
+    """
+    files = [f for f in files if f != clip_file]
+    clip_poly, clip_crs = prepare_clip_geometry(clip_file)
+    output_files = [output_file] * len(files)
+
+    if jobs > 1:
+        with ProcessPoolExecutor(
+                max_workers=jobs,
+                initializer=_init_clip,
+                initargs=(clip_poly, clip_crs),
+        ) as pool:
+            return list(pool.map(_clip_one, files, output_files))
+
+    _init_clip(clip_poly, clip_crs)
+    return [_clip_one(file, out) for file, out in zip(files, output_files)]
+
+
+def print_summary(results):
+    print(f"{'file':<40} {'features':>9} {'seconds':>9}")
+    for input_file, count, seconds in results:
+        print(f"{input_file:<40} {count:>9} {seconds:>9.3f}")
+    print(f"{'total':<40} {sum(r[1] for r in results):>9} {sum(r[2] for r in results):>9.3f}")
+
 
-        
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Clip shapefiles with other shapefiles")
     parser.add_argument(
@@ -51,11 +141,18 @@ if __name__ == '__main__':
         '--output-file',
         help='output file name',
     )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=1,
+        help='number of target files clipped in parallel',
+    )
     args = parser.parse_args()
 
-    for file in args.files:
-        clip_shp(
-            file,
-            clip_file=args.clip_file,
-            output_file=args.output_file,
-        )
+    results = clip_many(
+        args.files,
+        clip_file=args.clip_file,
+        jobs=args.jobs,
+        output_file=args.output_file,
+    )
+    print_summary(results)
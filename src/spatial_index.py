@@ -0,0 +1,144 @@
+import os
+import json
+import logging
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from src.util import read_layer, source_hash, LAYER_CACHE_DIR
+
+INDEX_DIR = os.path.join(LAYER_CACHE_DIR, 'index')
+INDEX_FILE = 'index.json'
+
+
+class LayerIndex:
+    """
+    Point-in-polygon and polygon overlap lookups against named layers, e.g. 'plots_1878' and
+    'districts_1929'. Every layer keeps its features in file order with an STRtree built once,
+    so that whole arrays of query coordinates are answered in a single bulk tree query.
+    Coordinates are in the CRS of the layer.
+    """
+
+    def __init__(self, layers: dict=None, sources: dict=None):
+        """
+        :param layers: dict of layer name: GeoDataFrame
+        :param sources: dict of layer name: content hash of the source shapefile
+        """
+        self.frames = {}
+        self.trees = {}
+        self.sources = dict(sources or {})
+        for name, frame in (layers or {}).items():
+            self.add(name, frame)
+
+    def add(self, name: str, frame: gpd.GeoDataFrame) -> None:
+        frame = frame.reset_index(drop=True)
+        self.frames[name] = frame
+        self.trees[name] = shapely.STRtree(np.asarray(frame.geometry))
+
+    @classmethod
+    def from_files(cls, files: Sequence[str], columns: Sequence[str]=None) -> 'LayerIndex':
+        """
+        :param files: Filepaths to spatial data (shapefiles); layers are named after the file
+        :param columns: Attribute columns to read, all by default
+        """
+        index = cls()
+        for fp in files:
+            name = os.path.splitext(os.path.basename(fp))[0]
+            index.add(name, read_layer(fp, columns=columns))
+            index.sources[name] = source_hash(fp)
+        return index
+
+    def contains_points(self, name: str, x, y) -> np.ndarray:
+        """
+        Finds the feature containing each point. Points on a shared edge go to the first feature.
+        :param name: Layer name
+        :param x: Array of x coordinates
+        :param y: Array of y coordinates
+        :return: Array of feature positions, -1 for points outside the layer
+        """
+        points = shapely.points(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        point_idx, feature_idx = self.trees[name].query(points, predicate='intersects')
+        result = np.full(len(points), -1, dtype=np.int64)
+        if not len(point_idx):
+            return result
+        order = np.lexsort((feature_idx, point_idx))
+        point_idx, feature_idx = point_idx[order], feature_idx[order]
+        first = np.r_[True, point_idx[1:] != point_idx[:-1]]
+        result[point_idx[first]] = feature_idx[first]
+        return result
+
+    def lookup(self, name: str, x, y, columns: Sequence[str]=None) -> pd.DataFrame:
+        """
+        Attributes of the features containing each point.
+        :param columns: Attribute columns to return, all by default
+        :return: DataFrame with a row per point, empty values for points outside the layer
+        """
+        frame = self.frames[name]
+        if columns is None:
+            columns = frame.columns.drop(frame.geometry.name)
+        positions = self.contains_points(name, x, y)
+        inside = positions >= 0
+        result = pd.DataFrame(index=pd.RangeIndex(len(positions)), columns=list(columns))
+        result.loc[inside, list(columns)] = frame[list(columns)].iloc[positions[inside]].to_numpy()
+        return result
+
+    def overlaps(self, name: str, geoms, predicate: str='intersects') -> np.ndarray:
+        """
+        :param name: Layer name
+        :param geoms: Array of geometries, e.g. the features of another layer
+        :param predicate: Spatial predicate between the query geometry and a feature
+        :return: (2, n) array of (query geometry position, feature position) pairs
+        """
+        return self.trees[name].query(np.asarray(geoms), predicate=predicate)
+
+    def overlaps_layer(self, name: str, other: str, predicate: str='intersects') -> np.ndarray:
+        """
+        Feature pairs between two indexed layers, e.g. which 1878 plots lie in which 1929 districts.
+        :return: (2, n) array of (feature position in other, feature position in name) pairs
+        """
+        return self.overlaps(name, self.frames[other].geometry, predicate=predicate)
+
+    def save(self, index_dir: str=INDEX_DIR) -> None:
+        """
+        Writes the layers as GeoParquet; the trees are rebuilt from the geometries on load.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        for name, frame in self.frames.items():
+            frame.to_parquet(os.path.join(index_dir, f'{name}.parquet'))
+        with open(os.path.join(index_dir, INDEX_FILE), 'w') as fout:
+            json.dump({name: self.sources.get(name) for name in self.frames}, fout, indent=2)
+        logging.info(f"LayerIndex.save: {len(self.frames)} layers written to {index_dir}.")
+
+    @classmethod
+    def load(cls, index_dir: str=INDEX_DIR) -> 'LayerIndex':
+        with open(os.path.join(index_dir, INDEX_FILE)) as fin:
+            sources = json.load(fin)
+        layers = {name: gpd.read_parquet(os.path.join(index_dir, f'{name}.parquet')) for name in sources}
+        return cls(layers, sources)
+
+
+def open_index(files: Sequence[str], index_dir: str=INDEX_DIR) -> LayerIndex:
+    """
+    Loads the stored index if it holds exactly these layers, built from their current content,
+    and otherwise builds the index from the shapefiles and stores it.
+    :param files: Filepaths to spatial data (shapefiles)
+    :param index_dir: Directory of the stored index
+    :return: LayerIndex
+    """
+    sources = {os.path.splitext(os.path.basename(fp))[0]: source_hash(fp) for fp in files}
+    try:
+        index = LayerIndex.load(index_dir)
+    except (OSError, ValueError, ImportError):
+        index = None
+    if index is not None and index.sources == sources:
+        return index
+
+    index = LayerIndex.from_files(files)
+    try:
+        index.save(index_dir)
+    except ImportError:
+        logging.warning("open_index: pyarrow is not installed, the index is not stored.")
+    return index
@@ -0,0 +1,33 @@
+MERCATOR_ORIGIN = 20037508.342789244
+WEB_MERCATOR = 'EPSG:3857'
+
+
+def tile_size(zoom: int) -> float:
+    """
+    :return: Width of an XYZ tile in EPSG:3857 meters
+    """
+    return 2 * MERCATOR_ORIGIN / 2 ** zoom
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> tuple:
+    """
+    :return: (xmin, ymin, xmax, ymax) of an XYZ tile in EPSG:3857
+    """
+    size = tile_size(zoom)
+    xmin = x * size - MERCATOR_ORIGIN
+    ymax = MERCATOR_ORIGIN - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def tile_range(bounds: tuple, zoom: int) -> tuple:
+    """
+    :param bounds: (xmin, ymin, xmax, ymax) in EPSG:3857
+    :return: (x0, y0, x1, y1) of the tiles covering bounds, inclusive
+    """
+    size = tile_size(zoom)
+    last = 2 ** zoom - 1
+    x0 = min(max(int((bounds[0] + MERCATOR_ORIGIN) // size), 0), last)
+    x1 = min(max(int((bounds[2] + MERCATOR_ORIGIN) // size), 0), last)
+    y0 = min(max(int((MERCATOR_ORIGIN - bounds[3]) // size), 0), last)
+    y1 = min(max(int((MERCATOR_ORIGIN - bounds[1]) // size), 0), last)
+    return x0, y0, x1, y1
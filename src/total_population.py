@@ -1,13 +1,12 @@
 import os
 
 import pandas as pd
-from bokeh.io import show, output_file
+from bokeh.io import show, save, output_file
 from bokeh.models import ColumnDataSource, HoverTool
 from bokeh.plotting import figure
 
 
-if __name__ == '__main__':
-    os.chdir('../data')
+def build():
     population = pd.read_csv('population_1799_2011.csv', index_col=0)
     source = ColumnDataSource(population)
 
@@ -32,4 +31,10 @@ if __name__ == '__main__':
     )
     fig.add_tools(hover)
     output_file(r'../figures/total_population.html')
-    show(fig)
+    save(fig)
+    return fig
+
+
+if __name__ == '__main__':
+    os.chdir('../data')
+    show(build())
@@ -1,14 +1,61 @@
 import os
+import glob
+import hashlib
 import logging
 import json
-from typing import Sequence
+import threading
+from typing import Sequence, Tuple
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
 
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
 from shapely.geometry import Polygon, Point
 from bokeh.plotting import figure
-from bokeh.models import Title
+from bokeh.models import Title, ColumnDataSource
+
+BASE_LAYER_CACHE_SIZE = 16
+VIEW_MARGIN = 0.25
+STATS_CACHE_SIZE = 32
+AREA_CACHE_SIZE = 16
+LAYER_CACHE_DIR = '.cache'
+EQUAL_AREA_CRS = 'EPSG:3035'
+SHAPEFILE_PARTS = '.shp', '.dbf', '.prj'
+YEAR_COLUMNS = 'year', 'vuosi'
+DISTRICT_COLUMNS = 'kaupunginosa', 'district', 'name'
+UMLAUTS = str.maketrans('äö', 'ao')
+
+PreparedLayer = namedtuple('PreparedLayer', 'frame coords offsets')
+View = namedtuple('View', 'x_range y_range width height')
+
+
+def read_layer(
+        fp: str,
+        bbox: Sequence[float]=None,
+        columns: Sequence[str]=None,
+        rows: int or slice=None,
+) -> gpd.GeoDataFrame:
+    """
+    Reads spatial data, pushing the extent and column selection down to the reader. With a bbox,
+    OGR's shapefile driver uses the spatial index next to the shapefile (.sbn/.sbx or .qix) to
+    skip features outside the extent; only the listed attribute columns are parsed from the .dbf.
+    :param fp: Filepath to spatial data (shapefile)
+    :param bbox: (xmin, ymin, xmax, ymax) in the CRS of the data
+    :param columns: Attribute columns to read, all by default; geometry is always read
+    :param rows: Number of rows or slice of rows to read
+    :return: geopandas.GeoDataFrame
+    """
+    kwargs = {}
+    if bbox is not None:
+        kwargs['bbox'] = tuple(bbox)
+    if columns is not None:
+        kwargs['columns'] = list(columns)
+    if rows is not None:
+        kwargs['rows'] = rows
+    return gpd.read_file(fp, **kwargs)
 
 
 def polygon_to_point(
@@ -20,12 +67,135 @@ def polygon_to_point(
         output_fp = f'{fp}_to_point.{ending}'
     with open(input_fp.replace('.shp', '.prj')) as crs_fin:
         crs_ = crs_fin.readline().strip()
-    data_ = gpd.read_file(input_fp)
+    data_ = read_layer(input_fp)
     data_['geometry'] = data_['geometry'].apply(lambda poly: poly.centroid)
     data_.to_file(output_fp, crs_wkt=crs_, encoding='utf-8')
     logging.info(f"polygon_to_point: Data written to file {output_fp}.")
 
 
+def read_stats_sheets(stats_fp: str) -> dict or None:
+    """
+    Parses non-spatial data once, all sheets of a workbook at a time. Parsed frames are cached
+    by file content hash, so repeated calls for other sheets or years cost nothing.
+    :param stats_fp: Filepath to non-spatial data (csv, xls, xlsx)
+    :return: dict of sheet name: pandas.DataFrame, with a single None key for csv
+    """
+    stats_format = os.path.splitext(stats_fp)[1].lstrip('.')
+    if stats_format not in ('csv', 'xls', 'xlsx'):
+        logging.error(f'read_stats_sheets: {stats_format} is not supported data format')
+        return None
+    digest = source_hash(stats_fp, extensions=(os.path.splitext(stats_fp)[1],))
+    return _read_stats_sheets(os.path.abspath(stats_fp), stats_format, digest)
+
+
+@lru_cache(maxsize=STATS_CACHE_SIZE)
+def _read_stats_sheets(stats_fp: str, stats_format: str, digest: str) -> dict:
+    sheets = read_columnar_stats(stats_fp)
+    if sheets is None:
+        sheets = convert_stats(stats_fp)
+    return sheets
+
+
+def _parse_stats(stats_fp: str) -> dict:
+    if stats_fp.endswith('.csv'):
+        sheets = {None: pd.read_csv(stats_fp)}
+    else:
+        sheets = {str(name): sheet for name, sheet in pd.read_excel(stats_fp, sheet_name=None).items()}
+    return {name: _typed_stats(sheet) for name, sheet in sheets.items()}
+
+
+def _typed_stats(data_stats: pd.DataFrame) -> pd.DataFrame:
+    """
+    Gives year and district columns explicit dtypes: year values as Int64, counts in columns
+    named by year as float64 and district names as string.
+    """
+    data_stats.columns = pd.Index([str(col) for col in data_stats.columns])
+    for col in data_stats.columns:
+        if col.lower() in YEAR_COLUMNS:
+            data_stats[col] = pd.to_numeric(data_stats[col], errors='coerce').astype('Int64')
+        elif col.isdigit() and len(col) == 4:
+            data_stats[col] = pd.to_numeric(data_stats[col], errors='coerce').astype('float64')
+        elif col.lower() in DISTRICT_COLUMNS:
+            data_stats[col] = data_stats[col].astype('string')
+    return data_stats
+
+
+def _columnar_manifest_fp(stats_fp: str) -> str:
+    stats_dir, stats_name = os.path.split(os.path.abspath(stats_fp))
+    return os.path.join(stats_dir, LAYER_CACHE_DIR, f'{stats_name}.sheets.json')
+
+
+def read_columnar_stats(stats_fp: str) -> dict or None:
+    """
+    Reads the columnar copy of non-spatial data written by convert_stats.
+    :return: dict of sheet name: pandas.DataFrame, None if there is no copy newer than the source
+    """
+    manifest_fp = _columnar_manifest_fp(stats_fp)
+    try:
+        if os.path.getmtime(manifest_fp) < os.path.getmtime(stats_fp):
+            return None
+        with open(manifest_fp) as fin:
+            manifest = json.load(fin)
+        cache_dir = os.path.dirname(manifest_fp)
+        return {name: pd.read_parquet(os.path.join(cache_dir, fp)) for name, fp in manifest}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        # an unreadable copy is converted again
+        logging.warning(f"read_columnar_stats: Columnar copy of {stats_fp} is unreadable ({type(e).__name__}).")
+        return None
+
+
+def convert_stats(stats_fp: str) -> dict:
+    """
+    Parses csv or every sheet of a workbook and writes each sheet as a typed Parquet file,
+    which read_stats_sheets uses for as long as it is newer than the source.
+    :param stats_fp: Filepath to non-spatial data (csv, xls, xlsx)
+    :return: dict of sheet name: pandas.DataFrame
+    """
+    sheets = _parse_stats(stats_fp)
+    manifest_fp = _columnar_manifest_fp(stats_fp)
+    cache_dir = os.path.dirname(manifest_fp)
+    stats_name = os.path.basename(stats_fp)
+    manifest = []
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for position, (name, sheet) in enumerate(sheets.items()):
+            sheet_fp = f'{stats_name}.{position}.parquet'
+            replace_atomically(os.path.join(cache_dir, sheet_fp), sheet.to_parquet)
+            manifest.append((name, sheet_fp))
+    except ImportError:
+        logging.warning(f"convert_stats: pyarrow is not installed, {stats_fp} is not converted.")
+        return sheets
+    dump_json(manifest_fp, manifest)
+    logging.info(f"convert_stats: {len(manifest)} sheets of {stats_fp} written to {cache_dir}.")
+    return sheets
+
+
+def convert_all_stats(data_dir: str='.') -> None:
+    """
+    Converts every csv and xlsx file in data_dir whose columnar copy is missing or stale.
+    """
+    for ending in ('csv', 'xls', 'xlsx'):
+        for stats_fp in sorted(glob.glob(os.path.join(data_dir, f'*.{ending}'))):
+            if read_columnar_stats(stats_fp) is None:
+                convert_stats(stats_fp)
+
+
+def read_stats(stats_fp: str, sheet: str or int=None) -> pd.DataFrame or None:
+    """
+    :param stats_fp: Filepath to non-spatial data (csv, xls, xlsx)
+    :param sheet: Sheet name or position, first sheet by default
+    :return: copy of the parsed sheet
+    """
+    sheets = read_stats_sheets(stats_fp)
+    if sheets is None:
+        return None
+    if sheet is None or isinstance(sheet, int):
+        return list(sheets.values())[sheet or 0].copy()
+    return sheets[str(sheet)].copy()
+
+
 def combine_data_to_file(
         shp_fp: str,
         stats_fp: str,
@@ -35,24 +205,17 @@ def combine_data_to_file(
 ) -> None:
     if not output_fp:
         output_fp = '{0}_{1}.shp'.format(shp_fp.split('.')[0], stats_fp.split('.')[0])
-    data_ = gpd.read_file(shp_fp)
-    with open(shp_fp.replace('.shp', '.prj')) as crs_fin:
-        crs_ = crs_fin.readline().strip()
+    data_ = read_layer(shp_fp)
 
-    stats_format = stats_fp.split('.', maxsplit=1)[1]
-    if stats_format == 'csv':
-        data_stats = pd.read_csv(stats_fp)
-    elif stats_format in ('xls', 'xlsx'):
-        data_stats = pd.read_excel(stats_fp)
-    else:
-        logging.error(f'combine_data: {stats_format} is not supported data format')
+    data_stats = read_stats(stats_fp)
+    if data_stats is None:
         return
 
     if stats_on:
         data_stats = data_stats.set_index(stats_on)
 
     data_ = data_.join(data_stats, **kwargs)
-    data_.to_file(output_fp, crs_wkt=crs_, encoding='utf-8')
+    data_.to_file(output_fp, encoding='utf-8')
     logging.info(f"combine_data: Data written to file {output_fp}.")
 
 
@@ -62,6 +225,7 @@ def combine_data(
         shp_on: str=None,
         stats_on: str=None,
         sheet: str or int=None,
+        shp_columns: Sequence[str]=None,
         **kwargs
 ) -> gpd.GeoDataFrame or None:
     """
@@ -71,36 +235,84 @@ def combine_data(
     :param shp_on: Which column of spatial data to use in join
     :param stats_on: Which column of non-spatial data to use in join
     :param sheet: which excel sheet to use
+    :param shp_columns: Attribute columns read from spatial data, all by default
     :param kwargs: Additional arguments for pandas.DataFrame.join
     :return: geopandas.GeoDataFrame with joined data
     """
-    data_ = gpd.read_file(shp_fp)
-    with open(shp_fp.replace('.shp', '.prj')) as crs_fin:
-        crs_ = crs_fin.readline().strip()
+    try:
+        return combine_sheets(
+            shp_fp,
+            stats_fp,
+            sheets=[sheet],
+            shp_on=shp_on,
+            stats_on=stats_on,
+            key=None,
+            shp_columns=shp_columns,
+            **kwargs
+        )
+    except KeyError:
+        logging.error(f"{stats_on} is wrong key. Check spelling")
+        return None
 
-    stats_format = stats_fp.split('.', maxsplit=1)[1]
-    if stats_format == 'csv':
-        data_stats = pd.read_csv(stats_fp)
-    elif stats_format in ('xls', 'xlsx'):
-        data_stats = pd.read_excel(stats_fp, sheet_name=sheet)
-    else:
-        logging.error(f'combine_data: {stats_format} is not supported data format')
+
+def combine_sheets(
+        shp_fp: str,
+        stats_fp: str,
+        sheets: Sequence=None,
+        shp_on: str=None,
+        stats_on: str=None,
+        key: str='year',
+        shp_columns: Sequence[str]=None,
+        **kwargs
+) -> gpd.GeoDataFrame or None:
+    """
+    Joins many sheets of non-spatial data, typically one per year, onto a single load of the
+    spatial data. The result is a long table with one row per sheet and feature.
+    :param shp_fp: Filepath to spatial data (shapefile)
+    :param stats_fp: Filepath to non-spatial data (csv, xls, xlsx)
+    :param sheets: Sheet names or positions; by default all sheets that have the stats_on column
+    :param shp_on: Which column of spatial data to use in join
+    :param stats_on: Which column of non-spatial data to use in join
+    :param key: Name of the column holding the sheet name, None to leave it out
+    :param shp_columns: Attribute columns read from spatial data, all by default
+    :param kwargs: Additional arguments for pandas.DataFrame.join
+    :return: geopandas.GeoDataFrame with joined data, None if the files can not be read, shp_on
+        is wrong or no sheet has the stats_on column
+    :raises KeyError: If one of the given sheets has no stats_on column
+    """
+    all_sheets = read_stats_sheets(stats_fp)
+    if all_sheets is None:
         return None
+    skip_unkeyed = sheets is None
+    if skip_unkeyed:
+        sheets = list(all_sheets)
 
+    data_ = read_layer(shp_fp, columns=shp_columns)
     if shp_on:
         try:
             data_ = data_.set_index(shp_on)
         except KeyError:
             logging.error(f"{shp_on} is wrong key. Check spelling")
             return None
-    if stats_on:
-        try:
+
+    frames = []
+    for sheet in sheets:
+        data_stats = read_stats(stats_fp, sheet)
+        if stats_on:
+            if stats_on not in data_stats.columns:
+                if skip_unkeyed:
+                    logging.warning(f"combine_sheets: Sheet {sheet} has no {stats_on} column, skipping.")
+                    continue
+                raise KeyError(f"Sheet {sheet} of {stats_fp} has no {stats_on} column")
             data_stats = data_stats.set_index(stats_on)
-        except KeyError:
-            logging.error(f"{stats_on} is wrong key. Check spelling")
-            return None
+        if key:
+            data_stats[key] = sheet
+        frames.append(data_stats)
+    if not frames:
+        logging.error(f"combine_sheets: No sheet of {stats_fp} has {stats_on} column.")
+        return None
 
-    data_ = data_.join(data_stats, **kwargs)
+    data_ = data_.join(pd.concat(frames), **kwargs)
     return data_.reset_index()
 
 
@@ -108,52 +320,87 @@ def shp_to_geojson(
         input_fp: str,
         geojson_fp: str=None,
         to_epsg: int=4326,
-        columns: Sequence[str]=None
+        columns: Sequence[str]=None,
+        newline_delimited: bool=False,
+        precision: int=None,
+        chunk_size: int=10000,
 ) -> None:
+    """
+    Writes spatial data to compact GeoJSON, streaming features to the file in chunks.
+    :param input_fp: Filepath to spatial data (shapefile)
+    :param geojson_fp: Output filepath, input name with .geojson ending by default
+    :param to_epsg: EPSG code of output coordinates
+    :param columns: Columns written as feature properties, all by default
+    :param newline_delimited: Write one feature per line instead of a FeatureCollection
+    :param precision: Number of decimals coordinates are rounded to
+    :param chunk_size: Number of features serialized at once
+    """
     if not geojson_fp:
         geojson_fp = '{0}.geojson'.format(input_fp.split('.')[0])
 
-    with open(input_fp.replace('.shp', '.prj')) as crs_fin:
-        crs_ = crs_fin.readline().strip()
-    data_ = gpd.read_file(input_fp)
+    source_columns = None
+    if columns:
+        # columns may be given with or without umlauts, the reader needs the names in the file
+        columns = [remove_umlauts(c) for c in columns]
+        available = read_layer(input_fp, rows=0).columns
+        source_columns = [c for c in available if remove_umlauts(c) in columns]
+        missing = set(columns) - {remove_umlauts(c) for c in source_columns}
+        if missing:
+            raise KeyError(f"{input_fp} has no columns {', '.join(sorted(missing))}")
+
+    data_ = read_layer(input_fp, columns=source_columns)
     crs_ = data_.crs
     data_ = data_.to_crs(epsg=to_epsg)
     logging.info(f'Coordinates transformed from EPSG {crs_} to {to_epsg}.')
 
     data_.columns = pd.Index([remove_umlauts(c) for c in data_.columns])
-    data_ = data_.applymap(remove_umlauts)
-
     if not columns:
         columns = data_.columns.drop('geometry')
-    geojson = {
-        'type': 'FeatureCollection',
-        'features': [],
-    }
-    for _, row in data_.iterrows():
-        feature = {
-            'type': 'Feature',
-            'properties': {},
-        }
-        point = row['geometry']
-        feature['geometry'] = {
-            'type': 'Point',
-            'coordinates': [point.x, point.y]
-        }
-        for col in columns:
-            feature['properties'][col] = row[col]
-        geojson['features'].append(feature)
-
-    with open(geojson_fp, 'w') as fout:
-        json.dump(geojson, fout, indent=2)
+    properties = pd.DataFrame(data_[list(columns)]).apply(remove_umlauts_series)
+
+    geoms = np.asarray(data_.geometry)
+    if precision is not None:
+        geoms = shapely.transform(geoms, lambda coords: np.round(coords, precision))
+
+    separator = '\n' if newline_delimited else ',\n'
+    with open(geojson_fp, 'w', encoding='utf-8') as fout:
+        if not newline_delimited:
+            fout.write('{"type": "FeatureCollection", "features": [\n')
+        for start in range(0, len(data_), chunk_size):
+            geometries = shapely.to_geojson(geoms[start:start + chunk_size])
+            records = properties.iloc[start:start + chunk_size].to_json(
+                orient='records',
+                lines=True,
+                force_ascii=False,
+            ).rstrip('\n').split('\n')
+            if start:
+                fout.write(separator)
+            fout.write(separator.join(
+                f'{{"type": "Feature", "geometry": {geometry or "null"}, "properties": {record}}}'
+                for geometry, record in zip(geometries, records)
+            ))
+        fout.write('\n' if newline_delimited else '\n]}\n')
     logging.info(f"shp_to_geojson: Data written to file {geojson_fp}.")
 
 
 def remove_umlauts(text):
     if isinstance(text, str):
-        text = text.replace('ä', 'a').replace('ö', 'o')
+        text = text.translate(UMLAUTS)
     return text
 
 
+def remove_umlauts_series(values: pd.Series) -> pd.Series:
+    """
+    remove_umlauts for a whole column at once; values other than strings are kept as they are.
+    """
+    if values.dtype != object and not pd.api.types.is_string_dtype(values):
+        return values
+    if pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'mixed'):
+        return values
+    text = values.str.translate(UMLAUTS)
+    return text.where(text.notna(), values)
+
+
 def multipolygons_to_polygons(
         geodataframe: gpd.GeoDataFrame,
         geometry_column='geometry',
@@ -161,28 +408,376 @@ def multipolygons_to_polygons(
 ) -> gpd.GeoDataFrame:
     """
     Turns rows with MultiPolygons into groups of rows with single Polygon each.
+    All parts are split and filtered in one array pass; attributes of the original row are kept.
     :param geodataframe:
     :param geometry_column: Column containing Polygons and Multipolygons.
     :param min_area: Size of Polygons to be removed
     :return: enlargened geodataframe with each Polygon in its own row
     """
-    new_geodataframe = gpd.GeoDataFrame(columns=geodataframe.columns)
-    for _, row in geodataframe.iterrows():
-        geom = row[geometry_column]
-        if geom.type == 'Polygon':
-            new_geodataframe = new_geodataframe.append(row)
-        elif geom.type == 'MultiPolygon':
-            for poly in geom:
-                new_row = row.copy()
-                new_row[geometry_column] = poly
-                if poly.area >= min_area:
-                    new_geodataframe = new_geodataframe.append(new_row)
-    return gpd.GeoDataFrame(new_geodataframe.reset_index())
+    geoms = np.asarray(geodataframe[geometry_column])
+    type_ids = shapely.get_type_id(geoms)
+    parts, row_index = shapely.get_parts(geoms, return_index=True)
+
+    is_polygon = type_ids[row_index] == shapely.GeometryType.POLYGON
+    is_multipolygon = type_ids[row_index] == shapely.GeometryType.MULTIPOLYGON
+    keep = is_polygon | (is_multipolygon & (shapely.area(parts) >= min_area))
+
+    new_geodataframe = pd.DataFrame(geodataframe.drop(columns=geometry_column)).iloc[row_index[keep]]
+    new_geodataframe = new_geodataframe.assign(**{geometry_column: parts[keep]})
+    return gpd.GeoDataFrame(
+        new_geodataframe.reset_index(),
+        geometry=geometry_column,
+        crs=geodataframe.crs,
+    )
+
+
+def get_exterior_coords(geoms) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads the exterior rings of all polygons in one pass into a flat coordinate buffer.
+    :param geoms: Sequence or GeoSeries of Polygons
+    :return: (coords, offsets), where coords is an (n, 2) array and the exterior
+        of polygon i is coords[offsets[i]:offsets[i + 1]]
+    """
+    geoms = np.asarray(geoms)
+    coords, index = shapely.get_coordinates(shapely.get_exterior_ring(geoms), return_index=True)
+    offsets = np.zeros(len(geoms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(index, minlength=len(geoms)), out=offsets[1:])
+    return coords, offsets
+
+
+def patches_data(coords: np.ndarray, offsets: np.ndarray) -> dict:
+    """
+    Splits coordinate buffers into the per-patch lists used by Bokeh patches glyphs.
+    :return: dict with 'x' and 'y' lists of arrays
+    """
+    return {
+        'x': np.split(coords[:, 0], offsets[1:-1]),
+        'y': np.split(coords[:, 1], offsets[1:-1]),
+    }
+
+
+def patches_source(
+        geodf: gpd.GeoDataFrame,
+        geometry_col: str='geometry',
+        columns: Sequence[str]=None,
+) -> ColumnDataSource:
+    """
+    Builds a ColumnDataSource for patches glyphs straight from coordinate buffers without a GeoJSON round-trip.
+    :param geodf: GeoDataFrame with Polygons
+    :param geometry_col: Column containing Polygons
+    :param columns: Attribute columns to include, all by default
+    :return: ColumnDataSource with 'x' and 'y' patch columns and attributes
+    """
+    data = patches_data(*get_exterior_coords(geodf[geometry_col]))
+    if columns is None:
+        columns = geodf.columns.drop(geometry_col)
+    for col in columns:
+        data[str(col)] = geodf[col].values
+    return ColumnDataSource(data)
+
+
+def source_hash(fp: str, extensions: Sequence[str]=SHAPEFILE_PARTS) -> str:
+    """
+    Content hash of a shapefile and its sidecar files.
+    :param fp: Filepath to spatial data (shapefile)
+    :param extensions: Sidecar extensions included in the hash; missing files are skipped
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    base, _ = os.path.splitext(fp)
+    for ext in extensions:
+        part_fp = base + ext
+        if not os.path.exists(part_fp):
+            continue
+        digest.update(ext.encode())
+        with open(part_fp, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def replace_atomically(fp: str, write) -> None:
+    """
+    Calls write with a temporary filepath next to fp and moves the finished file to fp, so that
+    an interrupted run or a concurrent writer never leaves a truncated file behind.
+    :param fp: Target filepath
+    :param write: Function writing a file to the filepath it is given
+    """
+    base, ending = os.path.splitext(fp)
+    tmp_fp = f'{base}.{os.getpid()}-{threading.get_ident()}.tmp{ending}'
+    try:
+        write(tmp_fp)
+        os.replace(tmp_fp, fp)
+    finally:
+        if os.path.exists(tmp_fp):
+            os.remove(tmp_fp)
+
+
+def load_json(fp: str, default=None):
+    """
+    :return: parsed content of a JSON state file, default if it is missing or unreadable
+    """
+    try:
+        with open(fp) as fin:
+            return json.load(fin)
+    except (OSError, ValueError):
+        return {} if default is None else default
+
+
+def dump_json(fp: str, data, **kwargs) -> None:
+    """
+    Writes a JSON state file atomically.
+    :param kwargs: Additional arguments for json.dump
+    """
+    def write(tmp_fp):
+        with open(tmp_fp, 'w') as fout:
+            json.dump(data, fout, **kwargs)
+
+    os.makedirs(os.path.dirname(fp) or '.', exist_ok=True)
+    replace_atomically(fp, write)
+
+
+def read_prepared_layer(
+        fp: str,
+        cache_dir: str=LAYER_CACHE_DIR,
+        bbox: Sequence[float]=None,
+        columns: Sequence[str]=None,
+) -> PreparedLayer:
+    """
+    Reads a layer exploded to single Polygons, with column names normalized by remove_umlauts and
+    exterior coordinates extracted. The prepared layer is stored in cache_dir as GeoParquet plus
+    a coordinate buffer file and reused until the content of the .shp/.dbf/.prj files changes.
+    :param fp: Filepath to spatial data (shapefile)
+    :param cache_dir: Directory for prepared layers
+    :param bbox: (xmin, ymin, xmax, ymax) the layer is clipped to; features outside are not read
+    :param columns: Attribute columns to read, all by default
+    :return: PreparedLayer(frame, coords, offsets)
+    """
+    stem = os.path.splitext(os.path.basename(fp))[0]
+    digest = source_hash(fp)
+    cache_fp = os.path.join(cache_dir, f'{stem}-{digest}')
+    if bbox is not None:
+        bbox = tuple(float(b) for b in bbox)
+    if bbox is not None or columns is not None:
+        selection = bbox, None if columns is None else list(columns)
+        cache_fp += '-' + hashlib.sha1(repr(selection).encode()).hexdigest()[:12]
+    try:
+        frame = gpd.read_parquet(f'{cache_fp}.parquet')
+        with np.load(f'{cache_fp}.npz') as buffers:
+            return PreparedLayer(frame, buffers['coords'], buffers['offsets'])
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        # unreadable cache files are rebuilt
+        logging.warning(f"read_prepared_layer: Cached {cache_fp} is unreadable ({type(e).__name__}).")
+
+    frame = read_layer(fp, bbox=bbox, columns=columns)
+    if bbox is not None:
+        frame = clip_to_bbox(frame, bbox)
+    frame = multipolygons_to_polygons(frame)
+    frame.columns = pd.Index([remove_umlauts(c) for c in frame.columns])
+    coords, offsets = get_exterior_coords(frame.geometry)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale_fp in glob.glob(os.path.join(cache_dir, f'{stem}-*')):
+        if not os.path.basename(stale_fp).startswith(f'{stem}-{digest}'):
+            os.remove(stale_fp)
+    try:
+        replace_atomically(f'{cache_fp}.parquet', frame.to_parquet)
+    except ImportError:
+        logging.warning(f"read_prepared_layer: pyarrow is not installed, {fp} is not cached.")
+    else:
+        replace_atomically(f'{cache_fp}.npz', lambda tmp_fp: np.savez(tmp_fp, coords=coords, offsets=offsets))
+        logging.info(f"read_prepared_layer: Prepared layer written to {cache_fp}.parquet.")
+    return PreparedLayer(frame, coords, offsets)
+
+
+def view_bbox(view: View, margin: float=VIEW_MARGIN) -> tuple:
+    """
+    :param view: View of a figure
+    :param margin: Share of the view width and height added on every side, so that panning
+        a little does not reveal the clipped edge
+    :return: (xmin, ymin, xmax, ymax)
+    """
+    (x0, x1), (y0, y1) = sorted(view.x_range), sorted(view.y_range)
+    dx, dy = (x1 - x0) * margin, (y1 - y0) * margin
+    return x0 - dx, y0 - dy, x1 + dx, y1 + dy
+
+
+def clip_to_bbox(geodf: gpd.GeoDataFrame, bbox: Sequence[float]) -> gpd.GeoDataFrame:
+    """
+    Clips geometries to a rectangle and drops features left empty.
+    :param bbox: (xmin, ymin, xmax, ymax)
+    """
+    geoms = shapely.clip_by_rect(np.asarray(geodf.geometry), *bbox)
+    geodf = geodf.copy()
+    geodf[geodf.geometry.name] = geoms
+    return geodf[~shapely.is_empty(geoms)]
+
+
+def layer_source(layer: PreparedLayer, columns: Sequence[str]=None) -> ColumnDataSource:
+    """
+    Builds a ColumnDataSource for patches glyphs from the stored coordinate buffers of a prepared layer.
+    :param layer: PreparedLayer
+    :param columns: Attribute columns to include, all by default
+    :return: ColumnDataSource with 'x' and 'y' patch columns and attributes
+    """
+    data = patches_data(layer.coords, layer.offsets)
+    if columns is None:
+        columns = layer.frame.columns.drop(layer.frame.geometry.name)
+    for col in columns:
+        data[str(col)] = layer.frame[col].values
+    return ColumnDataSource(data)
+
+
+def figure_view(fig: figure) -> View or None:
+    """
+    :return: View of a figure with explicit x and y ranges, None for auto-ranged figures
+    """
+    x_range = getattr(fig.x_range, 'start', None), getattr(fig.x_range, 'end', None)
+    y_range = getattr(fig.y_range, 'start', None), getattr(fig.y_range, 'end', None)
+    if None in x_range + y_range:
+        return None
+    return View(x_range, y_range, fig.width or 600, fig.height or 600)
+
+
+def simplify_geometries(geoms: np.ndarray, tolerance: float, coverage: bool=False) -> np.ndarray:
+    """
+    :param geoms: Array of geometries
+    :param tolerance: Simplification tolerance in data units
+    :param coverage: Simplify the polygons as a coverage, keeping edges shared by neighbours shared
+    :return: Array of simplified geometries
+    """
+    if coverage:
+        return shapely.coverage_simplify(geoms, tolerance)
+    return shapely.simplify(geoms, tolerance, preserve_topology=True)
+
+
+def simplify_for_view(
+        geodf: gpd.GeoDataFrame,
+        view: View=None,
+        pixels: float=0.5,
+        name: str='layer',
+        coverage: bool=False,
+) -> gpd.GeoDataFrame:
+    """
+    Simplifies geometries to what can be seen in a view. The tolerance is the given number of screen
+    pixels in data units, topology is preserved, and coordinates are rounded to one decimal finer
+    than the size of a pixel. Vertex and GeoJSON byte savings are logged.
+    :param geodf: GeoDataFrame in the coordinates of the view
+    :param view: View the layer is drawn in, None to return the layer as it is
+    :param pixels: Simplification tolerance in pixels
+    :param name: Layer name used in the log
+    :param coverage: The polygons tile an area, like districts or plots; shared edges are simplified
+        once for both neighbours so that no gaps or overlaps open between them
+    :return: simplified copy of geodf
+    """
+    if view is None:
+        return geodf
+    units_per_pixel = min(
+        abs(view.x_range[1] - view.x_range[0]) / view.width,
+        abs(view.y_range[1] - view.y_range[0]) / view.height,
+    )
+    decimals = max(0, int(np.ceil(-np.log10(units_per_pixel))) + 1)
+
+    geoms = np.asarray(geodf.geometry)
+    simplified = simplify_geometries(geoms, units_per_pixel * pixels, coverage=coverage)
+    simplified = shapely.transform(simplified, lambda coords: np.round(coords, decimals))
+
+    vertices_before = shapely.get_num_coordinates(geoms).sum()
+    vertices_after = shapely.get_num_coordinates(simplified).sum()
+    bytes_before = sum(len(g) for g in shapely.to_geojson(geoms) if g)
+    bytes_after = sum(len(g) for g in shapely.to_geojson(simplified) if g)
+    logging.info(
+        f"simplify_for_view: {name}: {vertices_before} -> {vertices_after} vertices, "
+        f"{bytes_before} -> {bytes_after} bytes as GeoJSON."
+    )
+
+    geodf = geodf.copy()
+    geodf[geodf.geometry.name] = simplified
+    return geodf
+
+
+def base_layer_source(fp: str, crs=None, view: View=None) -> ColumnDataSource:
+    """
+    Returns a patches source for a base layer such as water or islands. The prepared patch data is
+    cached process-wide, keyed by file path, modification time, target CRS and view, so that every
+    panel of a gridplot after the first gets the base map without reading the shapefile again.
+    Layers in the view's CRS are clipped to the view before they are prepared.
+    :param fp: Filepath to spatial data (shapefile)
+    :param crs: Target CRS (EPSG code or string), source CRS by default
+    :param view: View the layer is simplified for, None for full detail
+    :return: ColumnDataSource with 'x' and 'y' patch columns
+    """
+    fp = os.path.abspath(fp)
+    data = _base_layer_data(fp, os.path.getmtime(fp), crs, view)
+    return ColumnDataSource(dict(data))
+
+
+@lru_cache(maxsize=BASE_LAYER_CACHE_SIZE)
+def _base_layer_data(fp: str, mtime: float, crs, view: View) -> dict:
+    bbox = view_bbox(view) if view is not None and crs is None else None
+    layer = read_prepared_layer(fp, bbox=bbox, columns=[])
+    if crs is None and view is None:
+        return patches_data(layer.coords, layer.offsets)
+    frame = layer.frame if crs is None else layer.frame.to_crs(crs)
+    frame = simplify_for_view(frame, view, name=os.path.basename(fp))
+    return patches_data(*get_exterior_coords(frame.geometry))
+
+
+def draw_base_map(
+        fig: figure,
+        *,
+        water_file: str,
+        islands_file: str,
+        crs=None,
+        simplify: bool=True,
+) -> None:
+    """
+    Draws water and islands patches from the base-layer cache, simplified for the figure's view.
+    """
+    view = figure_view(fig) if simplify else None
+    fig.patches(
+        xs='x',
+        ys='y',
+        source=base_layer_source(water_file, crs, view),
+        fill_color='#59d0ff',
+        fill_alpha=0.8,
+        line_color=None,
+        line_width=0,
+    )
+    fig.patches(
+        xs='x',
+        ys='y',
+        source=base_layer_source(islands_file, crs, view),
+        fill_color='white',
+        line_color=None,
+        line_width=0,
+    )
+
+
+def layer_areas(fp: str, on: str) -> pd.Series:
+    """
+    Areas of the features of a layer measured from their geometry in an equal-area CRS, instead of
+    stored area attributes of unknown units. Areas are computed once per layer content and cached.
+    :param fp: Filepath to spatial data (shapefile)
+    :param on: Column identifying features; areas of features sharing a value are summed
+    :return: pandas.Series of areas in square meters indexed by the values of on
+    """
+    return _layer_areas(os.path.abspath(fp), on, source_hash(fp)).copy()
+
+
+@lru_cache(maxsize=AREA_CACHE_SIZE)
+def _layer_areas(fp: str, on: str, digest: str) -> pd.Series:
+    frame = read_layer(fp, columns=[on])
+    areas = pd.Series(frame.geometry.to_crs(EQUAL_AREA_CRS).area.to_numpy(), index=frame[on].to_numpy())
+    return areas.groupby(level=0).sum().rename('area')
 
 
 def get_xy(geodf: gpd.GeoDataFrame, geometry_col: str='geometry') -> gpd.GeoDataFrame:
-    geodf['x'] = geodf[geometry_col].apply(lambda geom: tuple(geom.exterior.coords.xy[0]))
-    geodf['y'] = geodf[geometry_col].apply(lambda geom: tuple(geom.exterior.coords.xy[1]))
+    xy = patches_data(*get_exterior_coords(geodf[geometry_col]))
+    geodf['x'] = [tuple(x) for x in xy['x']]
+    geodf['y'] = [tuple(y) for y in xy['y']]
     return geodf
 
 
@@ -193,18 +788,8 @@ def clip_shapefile_to_rectangle(
         x_range: Sequence,
         y_range: Sequence
 ) -> None:
-    target = gpd.read_file(target_fp)
-    crs_ = target.crs
-    display_area = gpd.GeoDataFrame()
-    display_area['geometry'] = None
-    display_area.loc[0, 'geometry'] = Polygon([
-        (x_range[0], y_range[1]),
-        (x_range[1], y_range[1]),
-        (x_range[1], y_range[0]),
-        (x_range[0], y_range[0]),
-    ])
-    target = gpd.overlay(target, display_area, how='intersection')
-    target.crs = crs_
+    bbox = min(x_range), min(y_range), max(x_range), max(y_range)
+    target = clip_to_bbox(read_layer(target_fp, bbox=bbox), bbox)
     print(target)
     target.to_file(output_fp)
 
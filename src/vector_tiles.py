@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+import fire
+
+from src.util import read_prepared_layer, simplify_geometries, load_json, dump_json
+from src.tile_grid import MERCATOR_ORIGIN, WEB_MERCATOR, tile_size, tile_bounds
+
+TILE_LAYERS = [
+    'plots_1878.shp',
+    'districts.shp',
+    'districts_1637.shp',
+    'districts_1703.shp',
+    'districts_1929.shp',
+    'water.shp',
+    'islands.shp',
+]
+TILE_FORMATS = 'geojson', 'pbf'
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MANIFEST_FILE = 'manifest.json'
+# layers whose polygons tile an area and are simplified as a coverage
+COVERAGE_LAYERS = 'plots_', 'districts'
+
+
+def tile_features(bounds: np.ndarray, zoom: int) -> dict:
+    """
+    Assigns features to the tiles their bounding boxes touch.
+    :param bounds: (n, 4) array of feature bounds in EPSG:3857
+    :param zoom: Zoom level
+    :return: dict of (x, y): array of feature positions
+    """
+    if not len(bounds):
+        return {}
+    size = tile_size(zoom)
+    last = 2 ** zoom - 1
+    x0 = np.clip(np.floor((bounds[:, 0] + MERCATOR_ORIGIN) / size), 0, last).astype(np.int64)
+    x1 = np.clip(np.floor((bounds[:, 2] + MERCATOR_ORIGIN) / size), 0, last).astype(np.int64)
+    y0 = np.clip(np.floor((MERCATOR_ORIGIN - bounds[:, 3]) / size), 0, last).astype(np.int64)
+    y1 = np.clip(np.floor((MERCATOR_ORIGIN - bounds[:, 1]) / size), 0, last).astype(np.int64)
+
+    nx = x1 - x0 + 1
+    counts = nx * (y1 - y0 + 1)
+    features = np.repeat(np.arange(len(bounds)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    xs = x0[features] + local % nx[features]
+    ys = y0[features] + local // nx[features]
+
+    order = np.lexsort((features, ys, xs))
+    xs, ys, features = xs[order], ys[order], features[order]
+    starts = np.flatnonzero(np.r_[True, (xs[1:] != xs[:-1]) | (ys[1:] != ys[:-1])])
+    return {
+        (int(xs[start]), int(ys[start])): part
+        for start, part in zip(starts, np.split(features, starts[1:]))
+    }
+
+
+def feature_hashes(frame: gpd.GeoDataFrame) -> np.ndarray:
+    """
+    :return: uint64 hash of every feature's geometry and attributes
+    """
+    attrs = pd.DataFrame(frame.drop(columns=frame.geometry.name))
+    attrs['__wkb'] = shapely.to_wkb(np.asarray(frame.geometry))
+    return pd.util.hash_pandas_object(attrs, index=False).to_numpy()
+
+
+def _encode_geojson(attrs: pd.DataFrame, geoms: np.ndarray, zoom: int) -> bytes:
+    frame = gpd.GeoDataFrame(attrs, geometry=geoms, crs=WEB_MERCATOR).to_crs(4326)
+    # one decimal finer than a pixel in degrees at this zoom
+    decimals = int(np.ceil(np.log10(256 * 2 ** zoom / 360))) + 1
+    frame[frame.geometry.name] = shapely.transform(
+        np.asarray(frame.geometry),
+        lambda coords: np.round(coords, decimals),
+    )
+    return frame.to_json(drop_id=True).encode('utf-8')
+
+
+def _encode_pbf(attrs: pd.DataFrame, geoms: np.ndarray, bounds: tuple, name: str) -> bytes:
+    import mapbox_vector_tile
+
+    properties = json.loads(attrs.to_json(orient='records'))
+    features = [{'geometry': geom, 'properties': props} for geom, props in zip(geoms, properties)]
+    return mapbox_vector_tile.encode(
+        [{'name': name, 'features': features}],
+        default_options={'quantize_bounds': bounds, 'extents': TILE_EXTENT},
+    )
+
+
+def build_layer_tiles(
+        fp: str,
+        output_dir: str='../figures/tiles',
+        min_zoom: int=12,
+        max_zoom: int=17,
+        tile_format: str='pbf',
+        pixels: float=0.5,
+        force: bool=False,
+) -> dict:
+    """
+    Cuts a layer into an XYZ vector tile pyramid in output_dir/<layer>/{z}/{x}/{y}.<tile_format>.
+    Geometries are simplified once per zoom to the given number of tile pixels. A manifest stores
+    a hash of the source features of every tile, and only tiles whose features changed are
+    written again; tiles left without features are removed.
+    :param fp: Filepath to spatial data (shapefile)
+    :param output_dir: Root directory of the tile pyramids
+    :param min_zoom: Lowest zoom level
+    :param max_zoom: Highest zoom level
+    :param tile_format: 'pbf' (Mapbox Vector Tile, needs mapbox-vector-tile) or 'geojson'
+    :param pixels: Simplification tolerance in pixels of a 256 pixel tile
+    :param force: Write unchanged tiles too
+    :return: dict with counts of 'written', 'unchanged' and 'removed' tiles
+    """
+    if tile_format not in TILE_FORMATS:
+        raise ValueError(f'Incorrect format {tile_format} (Must be one of {TILE_FORMATS})')
+    name = os.path.splitext(os.path.basename(fp))[0]
+    layer_dir = os.path.join(output_dir, name)
+    manifest_fp = os.path.join(layer_dir, MANIFEST_FILE)
+    manifest = load_json(manifest_fp)
+    if manifest.get('format') != tile_format:
+        manifest = {}
+    old_tiles = manifest.get('tiles', {})
+
+    frame = read_prepared_layer(fp).frame.to_crs(WEB_MERCATOR)
+    attrs = pd.DataFrame(frame.drop(columns=frame.geometry.name))
+    geoms = np.asarray(frame.geometry)
+    hashes = feature_hashes(frame)
+    bounds = shapely.bounds(geoms)
+    coverage = name.startswith(COVERAGE_LAYERS)
+
+    tiles = {}
+    written = unchanged = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        size = tile_size(zoom)
+        simplified = simplify_geometries(geoms, size / 256 * pixels, coverage=coverage)
+        params = f'{zoom}:{pixels}:{tile_format}'.encode()
+        for (x, y), features in tile_features(bounds, zoom).items():
+            key = f'{zoom}/{x}/{y}'
+            digest = hashlib.sha1(params + hashes[features].tobytes()).hexdigest()
+            tile_fp = os.path.join(layer_dir, str(zoom), str(x), f'{y}.{tile_format}')
+            if not force and old_tiles.get(key) == digest and os.path.exists(tile_fp):
+                tiles[key] = digest
+                unchanged += 1
+                continue
+
+            xmin, ymin, xmax, ymax = tile_bounds(zoom, x, y)
+            buffer = size * TILE_BUFFER / TILE_EXTENT
+            clipped = shapely.clip_by_rect(
+                simplified[features],
+                xmin - buffer,
+                ymin - buffer,
+                xmax + buffer,
+                ymax + buffer,
+            )
+            keep = ~shapely.is_empty(clipped)
+            if not keep.any():
+                continue
+            tile_attrs = attrs.iloc[features[keep]]
+            if tile_format == 'pbf':
+                content = _encode_pbf(tile_attrs, clipped[keep], (xmin, ymin, xmax, ymax), name)
+            else:
+                content = _encode_geojson(tile_attrs, clipped[keep], zoom)
+
+            os.makedirs(os.path.dirname(tile_fp), exist_ok=True)
+            with open(tile_fp, 'wb') as fout:
+                fout.write(content)
+            tiles[key] = digest
+            written += 1
+
+    removed = 0
+    for key in old_tiles.keys() - tiles.keys():
+        tile_fp = os.path.join(layer_dir, *key.split('/')) + f'.{tile_format}'
+        if os.path.exists(tile_fp):
+            os.remove(tile_fp)
+            removed += 1
+
+    dump_json(manifest_fp, {'format': tile_format, 'tiles': tiles}, sort_keys=True)
+    logging.info(f"build_layer_tiles: {name}: {written} written, {unchanged} unchanged, {removed} removed.")
+    return dict(written=written, unchanged=unchanged, removed=removed)
+
+
+def build_tiles(
+        layers=TILE_LAYERS,
+        output_dir='../figures/tiles',
+        min_zoom=12,
+        max_zoom=17,
+        tile_format='pbf',
+        force=False,
+):
+    """
+    Command line entry point. Builds or updates the vector tile pyramids of the atlas layers.
+    """
+    if isinstance(layers, str):
+        layers = [layers]
+    print(f"{'layer':<24} {'written':>8} {'unchanged':>10} {'removed':>8}")
+    for fp in layers:
+        counts = build_layer_tiles(
+            fp,
+            output_dir=output_dir,
+            min_zoom=min_zoom,
+            max_zoom=max_zoom,
+            tile_format=tile_format,
+            force=force,
+        )
+        print(f"{fp:<24} {counts['written']:>8} {counts['unchanged']:>10} {counts['removed']:>8}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    os.chdir('../data')
+    fire.Fire(build_tiles)
@@ -1,23 +1,13 @@
-import io
+import os
 
-import requests
 import pandas as pd
-from bokeh.io import show, output_file
+from bokeh.io import show, save, output_file
 from bokeh.models import ColumnDataSource, HoverTool
 from bokeh.plotting import figure
 
-DATA_DIR = 'https://raw.githubusercontent.com/AnttiHaerkoenen/vyborg_historical_town_atlas/master/data'
 
-
-def get_csv(file, data_dir=DATA_DIR):
-    url = '{0}/{1}'.format(data_dir, file)
-    s = requests.get(url).content
-    csv = io.StringIO(s.decode('utf-8'))
-    return csv
-
-
-if __name__ == '__main__':
-    births_deaths = pd.read_csv(get_csv('births_deaths.csv'), index_col=0)
+def build():
+    births_deaths = pd.read_csv('births_deaths.csv', index_col=0)
     source = ColumnDataSource(births_deaths)
     f = figure(
         title="Viipurin läänin syntyneisyys, kuolleisuus ja avioituneisuus 1815-1917",
@@ -43,4 +33,11 @@ if __name__ == '__main__':
 
     f.add_tools(hover)
 
-    show(f)
+    output_file(r'../figures/vyborg_province_births_deaths.html')
+    save(f)
+    return f
+
+
+if __name__ == '__main__':
+    os.chdir('../data')
+    show(build())
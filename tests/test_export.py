@@ -0,0 +1,52 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip('bokeh')
+
+from bokeh.plotting import figure
+
+from src.export import figure_hash
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HASH_SCRIPT = """
+from tests.test_export import draw
+from src.export import figure_hash
+print(figure_hash(draw()))
+"""
+
+
+def draw():
+    fig = figure(width=300, height=300, tools='hover,pan,wheel_zoom')
+    fig.patches([[0, 1, 1], [1, 2, 2]], [[0, 0, 1], [0, 0, 1]], legend_label='plots')
+    fig.line([0, 2], [1, 1], legend_label='shore')
+    return fig
+
+
+def test_figure_hash_same_figure():
+    assert figure_hash(draw()) == figure_hash(draw())
+
+
+def test_figure_hash_changed_figure():
+    fig = draw()
+    fig.title.text = 'changed'
+    assert figure_hash(fig) != figure_hash(draw())
+
+
+def test_figure_hash_across_processes():
+    digests = set()
+    for seed in '1', '2', '3':
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        result = subprocess.run(
+            [sys.executable, '-c', HASH_SCRIPT],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        digests.add(result.stdout.strip())
+    assert len(digests) == 1
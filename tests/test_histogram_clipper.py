@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+
+from rasterio.transform import from_origin
+
+from src.histogram_clipper import clip_histogram
+
+
+def test_clip_histogram_jpeg_ycbcr(tmp_path):
+    input_file = str(tmp_path / 'sheet.tif')
+    output_file = str(tmp_path / 'clipped.tif')
+    data = np.random.default_rng(0).integers(0, 256, (3, 256, 256), dtype=np.uint8)
+    with rasterio.open(
+            input_file,
+            'w',
+            driver='GTiff',
+            width=256,
+            height=256,
+            count=3,
+            dtype='uint8',
+            crs='EPSG:3067',
+            transform=from_origin(500000, 6700000, 1, 1),
+            tiled=True,
+            compress='jpeg',
+            photometric='ycbcr',
+    ) as fout:
+        fout.write(data)
+
+    clip_histogram(input_file, output_file, min_val=10, max_val=200)
+
+    with rasterio.open(output_file) as fin:
+        clipped = fin.read()
+        assert fin.crs == 'EPSG:3067'
+    assert clipped.min() >= 10 and clipped.max() <= 200
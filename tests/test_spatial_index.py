@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip('geopandas')
+
+import geopandas as gpd
+from shapely.geometry import box
+
+from src.spatial_index import LayerIndex
+
+
+@pytest.fixture
+def index():
+    plots = gpd.GeoDataFrame(
+        {'NUMBER': ['1', '2']},
+        geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)],
+    )
+    return LayerIndex({'plots': plots})
+
+
+def test_contains_points(index):
+    assert index.contains_points('plots', [0.5, 1.5, 5.0], [0.5, 0.5, 5.0]).tolist() == [0, 1, -1]
+
+
+def test_contains_points_shared_edge(index):
+    assert index.contains_points('plots', [1.0], [0.5]).tolist() == [0]
+
+
+def test_contains_points_outside(index):
+    assert index.contains_points('plots', [5.0], [5.0]).tolist() == [-1]
+
+
+def test_contains_points_empty(index):
+    assert index.contains_points('plots', [], []).tolist() == []
+
+
+def test_lookup_outside(index):
+    result = index.lookup('plots', [5.0, 0.5], [5.0, 0.5])
+    assert result['NUMBER'].isna().tolist() == [True, False]
+    assert result.loc[1, 'NUMBER'] == '1'